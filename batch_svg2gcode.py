@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Convert many SVG files to gcode in one go, across a pool of worker processes.
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from svg2gcode import SVG2GCodeConverter, add_conversion_arguments, gcode_path_for
+
+parser = argparse.ArgumentParser(description='Convert every svg file in a directory or matching a '
+    'glob to gcode, as svg2gcode.py does, writing each gcode file next to its svg. The settings '
+    'file is loaded once per worker, not once per svg.'
+)
+parser.add_argument('inputs', nargs='+', help="svg files, directories of svg files, or globs")
+add_conversion_arguments(parser)
+parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="convert this many files at once (default: one per CPU)")
+
+# The settings module for a worker process, set by init_worker
+_settings = None
+
+
+def init_worker(settings_name):
+    '''Load the settings module once for the worker process'''
+    global _settings
+    _settings = importlib.import_module(settings_name)
+
+
+def convert_file(svg_path, kwargs):
+    '''
+    Convert one svg file, returning (svg_path, seconds, points, gcode bytes, error).
+    The converter's output is discarded unless it fails. A failed conversion leaves no gcode
+    file, which could be mistaken for one that is ready to plot.
+    '''
+    start = time.perf_counter()
+    output = io.StringIO()
+    gcode_path = gcode_path_for(svg_path)
+    converter = None
+    try:
+        with contextlib.redirect_stdout(output):
+            converter = SVG2GCodeConverter(
+                settings=_settings, svg_path=svg_path, gcode_path=gcode_path, **kwargs
+            )
+            converter.convert()
+    except Exception as error:
+        # this worker goes on to convert other files, so nothing is left open
+        if converter is not None:
+            converter.abort()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(gcode_path)
+        return svg_path, time.perf_counter() - start, None, None, f'{error!r}\n{output.getvalue()}'
+    return svg_path, time.perf_counter() - start, converter.point_count, os.path.getsize(gcode_path), None
+
+
+def find_svgs(inputs):
+    '''Return the svg(z) files named, in the directories named, or matching the globs in inputs'''
+    svg_paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            svg_paths.extend(glob.glob(os.path.join(pattern, '*.svg')))
+            svg_paths.extend(glob.glob(os.path.join(pattern, '*.svgz')))
+        else:
+            svg_paths.extend(glob.glob(pattern))
+    return sorted(set(svg_paths))
+
+
+def print_summary(results):
+    '''Print a table of the time, point count and output size of each conversion'''
+    width = max([len('file')] + [len(result[0]) for result in results])
+    print(f'{"file":<{width}}  {"seconds":>8}  {"points":>10}  {"gcode bytes":>12}')
+    for svg_path, seconds, points, size, error in results:
+        if error is None:
+            print(f'{svg_path:<{width}}  {seconds:>8.2f}  {points:>10}  {size:>12}')
+        else:
+            print(f'{svg_path:<{width}}  {seconds:>8.2f}  FAILED: {error.splitlines()[0]}')
+    converted = [result for result in results if result[4] is None]
+    print(
+        f'{len(converted)} of {len(results)} files converted, '
+        f'{sum(result[2] for result in converted)} points, '
+        f'{sum(result[3] for result in converted)} gcode bytes'
+    )
+
+
+def main():
+    args = parser.parse_args()
+    svg_paths = find_svgs(args.inputs)
+    if not svg_paths:
+        parser.error('no svg files found')
+
+    kwargs = vars(args)
+    settings_name = kwargs.pop('settings')
+    jobs = kwargs.pop('jobs')
+    del kwargs['inputs']
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(settings_name,)) as executor:
+        futures = [executor.submit(convert_file, svg_path, kwargs) for svg_path in svg_paths]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            svg_path, seconds, points, size, error = results[-1]
+            if error is not None:
+                print(f'{svg_path} failed: {error}')
+
+    print_summary(results)
+    print(f'Total time: {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
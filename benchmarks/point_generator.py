@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Time shapes.point_generator on one long path, against the three parses of the same path data
+it used to make before flattening.
+
+Run from the repository root:
+
+    python -m benchmarks.point_generator --segments 20000
+"""
+import argparse
+import random
+import timeit
+
+from lib import cubicsuperpath, shapes, simplepath
+
+parser = argparse.ArgumentParser(description='Benchmark parsing and flattening a long SVG path.')
+parser.add_argument('--segments', type=int, default=20000, help="number of curves in the path")
+parser.add_argument('--repeat', type=int, default=5, help="number of timings to take the best of")
+parser.add_argument('--smoothness', type=float, default=0.2, help="flattening tolerance")
+
+
+def long_path(segments):
+    '''Return path data for a random walk of relative cubic curves'''
+    rand = random.Random(0)
+    curves = (
+        'c ' + ' '.join(f'{rand.uniform(-20, 20):.3f}' for _ in range(6))
+        for _ in range(segments)
+    )
+    return 'M 0 0 ' + ' '.join(curves)
+
+
+def parse_three_times(d):
+    '''The parsing done by point_generator before it shared one parse between its stages'''
+    if len(simplepath.parsePath(d)) == 0:
+        return
+    simple_path = simplepath.parsePath(d)
+    start = float(simple_path[0][1][0]), float(simple_path[0][1][1])
+    return start, cubicsuperpath.parsePath(d)
+
+
+def parse_once(d):
+    '''The parsing done by point_generator now'''
+    codes, coords = simplepath.parsePathArrays(d)
+    if len(codes) == 0:
+        return
+    start = coords[0], coords[1]
+    return start, cubicsuperpath.CubicSuperPath(simplepath.segmentsFromArrays(codes, coords))
+
+
+def best_of(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    args = parser.parse_args()
+    d = long_path(args.segments)
+    print(f'Path of {args.segments} curves, {len(d)} characters; best of {args.repeat}')
+
+    before = best_of(lambda: parse_three_times(d), args.repeat)
+    after = best_of(lambda: parse_once(d), args.repeat)
+    print(f'parse, three passes:  {before:.3f}s')
+    print(f'parse, one pass:      {after:.3f}s  ({before / after:.1f}x faster)')
+
+    total = best_of(lambda: list(shapes.point_generator(d, None, args.smoothness)), args.repeat)
+    print(f'point_generator:      {total:.3f}s  (parse and flatten)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+bbox.py
+Exact bounding boxes of SVG path data, worked out from the curves' parameters without
+flattening them.
+
+A cubic bezier is transformed by transforming its control points, so each curve is moved into
+the output coordinates first, and then the parameters t where its derivative is zero in x or y
+are found for every curve in a path at once by solving the quadratics with numpy. The extremes
+of elliptical arcs are found from the angles at which the transformed ellipse is tangent to
+the axes, if they are within the arc's sweep.
+"""
+from math import atan2, cos, hypot, pi, sin
+
+import numpy as np
+
+from . import simpletransform
+from .flatten import A, C, L, M, Q, Z, arc_center
+
+# Ways of measuring the bounding box of an SVG: from the points of its flattened shapes, or
+# from the shapes' own parameters
+FLATTENED = 'flattened'
+ANALYTIC = 'analytic'
+MODES = (FLATTENED, ANALYTIC)
+
+
+def compose(outer, inner):
+    '''
+    Return the 3x3 matrix applying the 2x3 or 3x3 matrix inner and then outer, where None
+    stands for the identity
+    '''
+    if outer is None or inner is None:
+        mat = inner if outer is None else outer
+        if mat is None or len(mat) == 3:
+            return mat
+        return np.vstack((np.asarray(mat, dtype=float), (0.0, 0.0, 1.0)))
+    return compose(outer, None) @ compose(inner, None)
+
+
+def linear_part(mat):
+    '''Return the 2x2 part of a transform matrix (or None) as the floats a, b, c, d'''
+    if mat is None:
+        return 1.0, 0.0, 0.0, 1.0
+    return mat[0][0], mat[0][1], mat[1][0], mat[1][1]
+
+
+def cubic_extents(ctrl):
+    '''Return the min and max x, y of the curves in a (k, 4, 2) array of cubic control points'''
+    p0, p1, p2, p3 = ctrl[:, 0], ctrl[:, 1], ctrl[:, 2], ctrl[:, 3]
+    # the derivative is 3(a t^2 + b t + c), solved for each axis as in Numerical Recipes
+    a = p3 - 3 * p2 + 3 * p1 - p0
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = -(b + np.copysign(np.sqrt(b * b - 4 * a * c), b)) / 2
+        roots = np.stack((q / a, c / q))
+    # roots off the curve (or imaginary) are replaced by t = 0, which is already an end point
+    t = np.where((roots > 0) & (roots < 1), roots, 0.0)
+    mt = 1 - t
+    values = mt ** 3 * p0 + 3 * mt * mt * t * p1 + 3 * mt * t * t * p2 + t ** 3 * p3
+    ends = np.stack((p0, p3))
+    return (
+        np.minimum(values.min(axis=(0, 1)), ends.min(axis=(0, 1))),
+        np.maximum(values.max(axis=(0, 1)), ends.max(axis=(0, 1))),
+    )
+
+
+def ellipse_extreme_points(cx, cy, rx, ry, phi, theta, dtheta, mat):
+    '''
+    Return the points of an arc of the ellipse centred on cx, cy with radii rx, ry rotated by
+    phi radians, from parametric angle theta through dtheta, where it would be furthest in x or
+    y once transformed by mat (or None). The ends of the arc are not included.
+    '''
+    a, b, c, d = linear_part(mat)
+    cos_phi = cos(phi)
+    sin_phi = sin(phi)
+    # the transformed ellipse is centre + u cos(t) + v sin(t)
+    u = (a * rx * cos_phi + b * rx * sin_phi, c * rx * cos_phi + d * rx * sin_phi)
+    v = (-a * ry * sin_phi + b * ry * cos_phi, -c * ry * sin_phi + d * ry * cos_phi)
+    points = []
+    for axis in range(2):
+        turning = atan2(v[axis], u[axis])
+        for t in (turning, turning + pi):
+            offset = (t - theta) % (2 * pi) if dtheta > 0 else (theta - t) % (2 * pi)
+            if offset <= abs(dtheta):
+                points.append((
+                    cx + rx * cos_phi * cos(t) - ry * sin_phi * sin(t),
+                    cy + rx * sin_phi * cos(t) + ry * cos_phi * sin(t),
+                ))
+    return points
+
+
+def ellipse_extents(cx, cy, rx, ry, mat):
+    '''Return the min and max x, y of a whole ellipse with axes along x and y, transformed by mat'''
+    a, b, c, d = linear_part(mat)
+    if mat is not None:
+        cx, cy = a * cx + b * cy + mat[0][2], c * cx + d * cy + mat[1][2]
+    # the transformed ellipse is centre + u cos(t) + v sin(t), which is furthest from the
+    # centre along each axis by the length of (u, v) on that axis
+    half_x = hypot(a * rx, b * ry)
+    half_y = hypot(c * rx, d * ry)
+    return np.array((cx - half_x, cy - half_y)), np.array((cx + half_x, cy + half_y))
+
+
+def path_extents(codes, coords, mat):
+    '''
+    Return the min and max x, y of the output of simplepath.parsePathArrays once transformed by
+    mat (or None), or None if the path is empty
+    '''
+    if len(codes) == 0:
+        return None
+    points = []
+    cubics = []
+    i = 0
+    x = y = start_x = start_y = 0.0
+    for code in codes:
+        if code == M or code == L:
+            x, y = coords[i:i + 2]
+            if code == M:
+                start_x, start_y = x, y
+            points.append((x, y))
+            i += 2
+        elif code == C:
+            cubics.append((x, y) + tuple(coords[i:i + 6]))
+            x, y = coords[i + 4:i + 6]
+            i += 6
+        elif code == Q:
+            # measured as the equivalent cubic
+            qx, qy, x3, y3 = coords[i:i + 4]
+            cubics.append((
+                x, y,
+                x + 2 * (qx - x) / 3, y + 2 * (qy - y) / 3,
+                x3 + 2 * (qx - x3) / 3, y3 + 2 * (qy - y3) / 3,
+                x3, y3,
+            ))
+            x, y = x3, y3
+            i += 4
+        elif code == A:
+            rx, ry, angle, large_arc, sweep, x2, y2 = coords[i:i + 7]
+            center = arc_center(x, y, rx, ry, angle, large_arc, sweep, x2, y2)
+            if center is not None:
+                points.extend(ellipse_extreme_points(*center, mat))
+            x, y = x2, y2
+            points.append((x, y))
+            i += 7
+        elif code == Z:
+            x, y = start_x, start_y
+
+    points = np.array(points)
+    if mat is not None:
+        points = simpletransform.applyTransformToPoints(mat, points)
+    low, high = points.min(axis=0), points.max(axis=0)
+    if cubics:
+        ctrl = np.array(cubics).reshape(-1, 2)
+        if mat is not None:
+            ctrl = simpletransform.applyTransformToPoints(mat, ctrl)
+        cubic_low, cubic_high = cubic_extents(ctrl.reshape(-1, 4, 2))
+        low, high = np.minimum(low, cubic_low), np.maximum(high, cubic_high)
+    return low, high
@@ -21,6 +21,7 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 from . import simplepath 
 from math import *
+import numpy
 
 def matprod(mlist):
     prod=mlist[0]
@@ -163,7 +164,105 @@ def parsePath(d):
     return CubicSuperPath(simplepath.parsePath(d))
 
 def formatPath(p):
+    if isinstance(p, CompactSuperPath):
+        p = p.toList()
     return simplepath.formatPath(unCubicSuperPath(p))
 
+class CompactSuperPath(object):
+    """
+    A cubicsuperpath held in two arrays rather than nested lists: `nodes`, an (n, 3, 2) float64
+    array of every [ctrl1, point, ctrl2] node in the path, and `offsets`, the index in nodes of
+    the first node of each subpath followed by n. A node takes 48 bytes rather than the several
+    hundred of the list form.
+
+    Iterating a CompactSuperPath yields an (m, 3, 2) view of the nodes of each subpath, which
+    can be indexed like a list form subpath, e.g. by flatten.flatten_csp. Use toList() for
+    functions that modify the list form in place, such as cspsubdiv.
+    """
+    __slots__ = ('nodes', 'offsets')
+
+    def __init__(self, nodes, offsets):
+        self.nodes = nodes
+        self.offsets = offsets
+
+    @classmethod
+    def fromList(cls, csp):
+        '''Return a CompactSuperPath holding a list form cubicsuperpath'''
+        nodes = numpy.array([node for sp in csp for node in sp], dtype=float).reshape(-1, 3, 2)
+        offsets = numpy.zeros(len(csp) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(sp) for sp in csp], out=offsets[1:])
+        return cls(nodes, offsets)
+
+    @classmethod
+    def parsePath(cls, d):
+        '''Return a CompactSuperPath for svg path data'''
+        return cls.fromList(CubicSuperPath(simplepath.segmentsFromArrays(*simplepath.parsePathArrays(d))))
+
+    def toList(self):
+        '''Return the path in the list form of CubicSuperPath'''
+        return [sp.tolist() for sp in self]
+
+    def subpath(self, i):
+        '''Return an (m, 3, 2) view of the nodes of subpath i'''
+        return self.nodes[self.offsets[i]:self.offsets[i + 1]]
+
+    def transform(self, mat):
+        '''Transform every node in place by a 2x3 or 3x3 matrix'''
+        mat = numpy.asarray(mat, dtype=float)
+        points = self.nodes.reshape(-1, 2)
+        points[:] = points @ mat[:2, :2].T + mat[:2, 2]
+
+    def reversed(self):
+        '''Return the path drawn backwards, its subpaths in reverse order and each reversed'''
+        # reversing every node also swaps its two control points
+        nodes = self.nodes[::-1, ::-1].copy()
+        return CompactSuperPath(nodes, len(nodes) - self.offsets[::-1])
+
+    @classmethod
+    def joined(cls, paths):
+        '''
+        Return CompactSuperPaths joined end to start into one path, with the last subpath of
+        each continuing into the first of the next by a straight line
+        '''
+        nodes = numpy.concatenate([path.nodes for path in paths])
+        offsets = [paths[0].offsets[:-1]]
+        size = len(paths[0].nodes)
+        for path in paths[1:]:
+            offsets.append(path.offsets[1:-1] + size)
+            size += len(path.nodes)
+        offsets.append([size])
+        return cls(nodes, numpy.concatenate(offsets).astype(numpy.int64))
+
+    @property
+    def nbytes(self):
+        return self.nodes.nbytes + self.offsets.nbytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.subpath(i)
+
+    def __getitem__(self, i):
+        '''Return subpath i, or a CompactSuperPath of the subpaths in a slice'''
+        if not isinstance(i, slice):
+            return self.subpath(range(len(self))[i])
+        indices = range(len(self))[i]
+        if not indices:
+            return CompactSuperPath(self.nodes[:0], numpy.zeros(1, dtype=numpy.int64))
+        if indices.step == 1:
+            # a run of subpaths shares its nodes, as a slice of the list form shares its subpaths
+            start, stop = indices[0], indices[-1] + 1
+            nodes = self.nodes[self.offsets[start]:self.offsets[stop]]
+            return CompactSuperPath(nodes, self.offsets[start:stop + 1] - self.offsets[start])
+        subpaths = [self.subpath(k) for k in indices]
+        offsets = numpy.zeros(len(subpaths) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(sp) for sp in subpaths], out=offsets[1:])
+        return CompactSuperPath(numpy.concatenate(subpaths), offsets)
+
+    def __repr__(self):
+        return 'CompactSuperPath(%d subpaths, %d nodes)' % (len(self), len(self.nodes))
+
 
 # vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+"""
+flatten.py
+Non-recursive flattening of cubic bezier paths into arrays of points.
+
+Each curve is split in half with de Casteljau's algorithm until both of its control points lie
+within `flat` of the chord, the same test as cspsubdiv.subdiv, but the pieces still to be
+examined are kept on an explicit stack rather than the Python call stack, and the resulting
+points are written into a preallocated array rather than inserted into the superpath.
+
+In the 'fixed' mode, the number of points for each curve is instead worked out up front from a
+bound on how far the curve can be from its chords, using the second differences of its control
+points, and every curve in a path is evaluated in one numpy batch. Quadratic curves are
+evaluated as they are, rather than as the equivalent cubics.
+
+Elliptical arcs, and circle and ellipse elements, are not converted to curves at all: the number
+of chords needed to stay within `flat` of the ellipse is worked out from its radius, and the
+points are evaluated in one go with numpy.
+"""
+from math import acos, atan2, ceil, cos, pi, radians, sin, sqrt
+
+import numpy as np
+
+from . import simpletransform
+
+# Curves are not split more than this many times, which bounds the stack and the work done on
+# degenerate (e.g. NaN) input.
+MAX_DEPTH = 24
+
+# Arcs are split into chords subtending no more than this angle, however small their radius.
+MAX_ARC_STEP = pi / 2
+
+# Curves are not split into more than this many chords in the 'fixed' mode.
+MAX_FIXED_STEPS = 1 << 16
+
+ADAPTIVE = 'adaptive'
+FIXED = 'fixed'
+MODES = (ADAPTIVE, FIXED)
+
+# Command codes in the output of simplepath.parsePathArrays
+M, L, C, Q, A, Z = (ord(command) for command in 'MLCQAZ')
+
+
+def maxdist(p0x, p0y, p1x, p1y, p2x, p2y, p3x, p3y):
+    '''Return the greater distance of the two control points from the chord p0 -> p3'''
+    dx = p3x - p0x
+    dy = p3y - p0y
+    c2 = dx * dx + dy * dy
+    result = 0.0
+    for px, py in ((p1x, p1y), (p2x, p2y)):
+        c1 = (px - p0x) * dx + (py - p0y) * dy
+        if c1 <= 0:
+            d = sqrt((px - p0x) ** 2 + (py - p0y) ** 2)
+        elif c2 <= c1:
+            d = sqrt((px - p3x) ** 2 + (py - p3y) ** 2)
+        else:
+            d = abs(dx * (p0y - py) - (p0x - px) * dy) / sqrt(c2)
+        if d > result:
+            result = d
+    return result
+
+
+def flatten_cubic(p0, p1, p2, p3, flat, out, n):
+    '''
+    Write the points flattening the cubic p0, p1, p2, p3 into `out` from row `n`, excluding p0
+    (which ends the previous curve). `out` is grown by doubling if it is too small.
+    Return the (possibly reallocated) array and the number of rows now used.
+    '''
+    stack = [(p0[0], p0[1], p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], 0)]
+    while stack:
+        p0x, p0y, p1x, p1y, p2x, p2y, p3x, p3y, depth = stack.pop()
+        if depth >= MAX_DEPTH or maxdist(p0x, p0y, p1x, p1y, p2x, p2y, p3x, p3y) <= flat:
+            if n == len(out):
+                out = np.resize(out, (2 * n, 2))
+            out[n] = (p3x, p3y)
+            n += 1
+            continue
+        # split at t = 0.5
+        q1x = (p0x + p1x) / 2
+        q1y = (p0y + p1y) / 2
+        mx = (p1x + p2x) / 2
+        my = (p1y + p2y) / 2
+        r2x = (p2x + p3x) / 2
+        r2y = (p2y + p3y) / 2
+        q2x = (q1x + mx) / 2
+        q2y = (q1y + my) / 2
+        r1x = (mx + r2x) / 2
+        r1y = (my + r2y) / 2
+        midx = (q2x + r1x) / 2
+        midy = (q2y + r1y) / 2
+        depth += 1
+        # the second half is pushed first so that the first half is popped first
+        stack.append((midx, midy, r1x, r1y, r2x, r2y, p3x, p3y, depth))
+        stack.append((p0x, p0y, q1x, q1y, q2x, q2y, midx, midy, depth))
+    return out, n
+
+
+def flatten_subpath(sp, flat):
+    '''
+    Flatten one subpath of a cubicsuperpath, returning an (n, 2) array of the points on the
+    curve, starting with the subpath's first node.
+    '''
+    out = np.empty((4 * len(sp) + 1, 2))
+    out[0] = sp[0][1]
+    n = 1
+    for i in range(1, len(sp)):
+        out, n = flatten_cubic(sp[i - 1][1], sp[i - 1][2], sp[i][0], sp[i][1], flat, out, n)
+    return out[:n]
+
+
+def flatten_csp(csp, flat):
+    '''Flatten a cubicsuperpath, returning one array of points per subpath'''
+    return [flatten_subpath(sp, flat) for sp in csp]
+
+
+def grow(out, n, extra):
+    '''Return `out`, reallocated if needed so that it has room for `extra` rows after row `n`'''
+    if n + extra > len(out):
+        out = np.resize(out, (max(2 * len(out), n + extra), 2))
+    return out
+
+
+def arc_steps(radius, sweep, flat):
+    '''Return the number of chords splitting an arc of a circle so they are within `flat` of it'''
+    if radius > flat:
+        step = min(2 * acos(1 - flat / radius), MAX_ARC_STEP)
+    else:
+        step = MAX_ARC_STEP
+    return max(1, ceil(abs(sweep) / step))
+
+
+def ellipse_points(cx, cy, rx, ry, phi, theta, dtheta, flat):
+    '''
+    Return the points flattening the ellipse centred on cx, cy with radii rx, ry rotated by phi
+    radians, from parametric angle theta (excluded) to theta + dtheta (included).
+    '''
+    steps = arc_steps(max(rx, ry), dtheta, flat)
+    t = theta + np.arange(1, steps + 1) * (dtheta / steps)
+    cos_t = np.cos(t)
+    sin_t = np.sin(t)
+    cos_phi = cos(phi)
+    sin_phi = sin(phi)
+    points = np.empty((steps, 2))
+    points[:, 0] = cx + rx * cos_phi * cos_t - ry * sin_phi * sin_t
+    points[:, 1] = cy + rx * sin_phi * cos_t + ry * cos_phi * sin_t
+    return points
+
+
+def flatten_ellipse(cx, cy, rx, ry, flat):
+    '''
+    Flatten a whole ellipse, returning an (n, 2) array of points starting and ending at
+    (cx - rx, cy), in the same direction as the path data for a shapes.ellipse.
+    '''
+    points = np.empty((1, 2))
+    points[0] = (cx - rx, cy)
+    return np.concatenate((points, ellipse_points(cx, cy, rx, ry, 0.0, pi, -2 * pi, flat)))
+
+
+def arc_center(x1, y1, rx, ry, angle, large_arc, sweep, x2, y2):
+    '''
+    Convert the parameters of an SVG elliptical arc command from x1, y1 to the centre cx, cy,
+    the radii rx, ry, the rotation phi in radians, and the start and sweep parametric angles
+    theta, dtheta of the ellipse it lies on. Out of range radii are corrected as described in
+    the SVG implementation notes. Return None if the arc is a straight line or nothing at all.
+    '''
+    rx = abs(rx)
+    ry = abs(ry)
+    if (x1 == x2 and y1 == y2) or rx == 0 or ry == 0:
+        return None
+
+    phi = radians(angle)
+    cos_phi = cos(phi)
+    sin_phi = sin(phi)
+    dx = (x1 - x2) / 2
+    dy = (y1 - y2) / 2
+    x1p = cos_phi * dx + sin_phi * dy
+    y1p = -sin_phi * dx + cos_phi * dy
+
+    scale = (x1p / rx) ** 2 + (y1p / ry) ** 2
+    if scale > 1:
+        rx *= sqrt(scale)
+        ry *= sqrt(scale)
+        coef = 0.0
+    else:
+        numerator = (rx * ry) ** 2 - (rx * y1p) ** 2 - (ry * x1p) ** 2
+        coef = sqrt(max(0.0, numerator / ((rx * y1p) ** 2 + (ry * x1p) ** 2)))
+        if bool(large_arc) == bool(sweep):
+            coef = -coef
+    cxp = coef * rx * y1p / ry
+    cyp = -coef * ry * x1p / rx
+    cx = cos_phi * cxp - sin_phi * cyp + (x1 + x2) / 2
+    cy = sin_phi * cxp + cos_phi * cyp + (y1 + y2) / 2
+
+    theta = atan2((y1p - cyp) / ry, (x1p - cxp) / rx)
+    dtheta = atan2((-y1p - cyp) / ry, (-x1p - cxp) / rx) - theta
+    if sweep and dtheta < 0:
+        dtheta += 2 * pi
+    elif not sweep and dtheta > 0:
+        dtheta -= 2 * pi
+    return cx, cy, rx, ry, phi, theta, dtheta
+
+
+def flatten_arc(x1, y1, rx, ry, angle, large_arc, sweep, x2, y2, flat):
+    '''
+    Flatten the parameters of an SVG elliptical arc command from x1, y1, returning an (n, 2)
+    array of points excluding x1, y1 and ending exactly at x2, y2.
+    '''
+    if x1 == x2 and y1 == y2:
+        return np.empty((0, 2))
+    center = arc_center(x1, y1, rx, ry, angle, large_arc, sweep, x2, y2)
+    if center is None:
+        return np.array([[x2, y2]])
+
+    points = ellipse_points(*center, flat)
+    points[-1] = (x2, y2)
+    return points
+
+
+def flatten_path(codes, coords, flat, mode=ADAPTIVE):
+    '''
+    Flatten the output of simplepath.parsePathArrays, returning one (n, 2) array of points for
+    each subpath. `mode` is one of MODES.
+    '''
+    if mode == FIXED:
+        return flatten_path_fixed(codes, coords, flat)
+    return flatten_path_adaptive(codes, coords, flat)
+
+
+def flatten_path_adaptive(codes, coords, flat):
+    '''Flatten path arrays, subdividing each curve until it is within `flat` of its chords'''
+    result = []
+    out = None
+    n = 0
+    i = 0
+    x = y = start_x = start_y = 0.0
+    for code in codes:
+        if code == M:
+            if out is not None:
+                result.append(out[:n])
+            x = start_x = coords[i]
+            y = start_y = coords[i + 1]
+            out = np.empty((64, 2))
+            out[0] = (x, y)
+            n = 1
+            i += 2
+            continue
+        if code == L:
+            out = grow(out, n, 1)
+            x = out[n, 0] = coords[i]
+            y = out[n, 1] = coords[i + 1]
+            n += 1
+            i += 2
+        elif code == C:
+            x1, y1, x2, y2, x3, y3 = coords[i:i + 6]
+            out, n = flatten_cubic((x, y), (x1, y1), (x2, y2), (x3, y3), flat, out, n)
+            x, y = x3, y3
+            i += 6
+        elif code == Q:
+            # flattened as the equivalent cubic
+            qx, qy, x3, y3 = coords[i:i + 4]
+            out, n = flatten_cubic(
+                (x, y),
+                (x + 2 * (qx - x) / 3, y + 2 * (qy - y) / 3),
+                (x3 + 2 * (qx - x3) / 3, y3 + 2 * (qy - y3) / 3),
+                (x3, y3),
+                flat, out, n
+            )
+            x, y = x3, y3
+            i += 4
+        elif code == A:
+            rx, ry, angle, large_arc, sweep, x2, y2 = coords[i:i + 7]
+            points = flatten_arc(x, y, rx, ry, angle, large_arc, sweep, x2, y2, flat)
+            out = grow(out, n, len(points))
+            out[n:n + len(points)] = points
+            n += len(points)
+            x, y = x2, y2
+            i += 7
+        elif code == Z:
+            if (x, y) != (start_x, start_y):
+                out = grow(out, n, 1)
+                out[n] = (start_x, start_y)
+                n += 1
+            x, y = start_x, start_y
+    if out is not None:
+        result.append(out[:n])
+    return result
+
+
+def fixed_steps(lengths, factor, flat):
+    '''
+    Return the number of equal parameter steps for curves with second differences of the given
+    lengths to be within `flat` of their chords, where factor is n(n-1)/8 for a curve of degree n
+    '''
+    steps = np.ceil(np.sqrt(factor * lengths / flat))
+    return np.fmax(1, np.fmin(steps, MAX_FIXED_STEPS)).astype(int)
+
+
+def curve_parameters(steps):
+    '''
+    For curves split into the given numbers of steps, return the index of the curve and the
+    parameter t of every point after the start of each curve, and the index of each curve's first
+    point in them
+    '''
+    starts = np.cumsum(steps) - steps
+    curve = np.repeat(np.arange(len(steps)), steps)
+    t = (np.arange(len(curve)) - starts[curve] + 1) / steps[curve]
+    return curve, t[:, None], starts
+
+
+def evaluate_cubics(ctrl, flat):
+    '''
+    Flatten a (k, 4, 2) array of cubic control points, returning all of their points but the
+    first of each curve, and the index of each curve's first point in them
+    '''
+    d1 = ctrl[:, 0] - 2 * ctrl[:, 1] + ctrl[:, 2]
+    d2 = ctrl[:, 1] - 2 * ctrl[:, 2] + ctrl[:, 3]
+    lengths = np.maximum(np.hypot(d1[:, 0], d1[:, 1]), np.hypot(d2[:, 0], d2[:, 1]))
+    steps = fixed_steps(lengths, 0.75, flat)
+    curve, t, starts = curve_parameters(steps)
+    mt = 1 - t
+    c = ctrl[curve]
+    points = mt ** 3 * c[:, 0] + 3 * mt * mt * t * c[:, 1] + 3 * mt * t * t * c[:, 2] + t ** 3 * c[:, 3]
+    return points, starts, steps
+
+
+def evaluate_quadratics(ctrl, flat):
+    '''As evaluate_cubics, for a (k, 3, 2) array of quadratic control points'''
+    d = ctrl[:, 0] - 2 * ctrl[:, 1] + ctrl[:, 2]
+    steps = fixed_steps(np.hypot(d[:, 0], d[:, 1]), 0.25, flat)
+    curve, t, starts = curve_parameters(steps)
+    mt = 1 - t
+    c = ctrl[curve]
+    points = mt * mt * c[:, 0] + 2 * mt * t * c[:, 1] + t * t * c[:, 2]
+    return points, starts, steps
+
+
+def flatten_path_fixed(codes, coords, flat):
+    '''
+    Flatten path arrays, evaluating all of the curves together at a number of steps
+    found from their control points
+    '''
+    # Each subpath is collected as a list of pieces: arrays of points, or the index of a curve
+    # in `cubics` or `quadratics`, to be evaluated once they have all been found.
+    subpaths = []
+    pieces = None
+    line_points = []
+    cubics = []
+    quadratics = []
+    i = 0
+    x = y = start_x = start_y = 0.0
+    for code in codes:
+        if code == M:
+            if line_points:
+                pieces.append(np.array(line_points))
+            x = start_x = coords[i]
+            y = start_y = coords[i + 1]
+            pieces = []
+            subpaths.append(pieces)
+            line_points = [(x, y)]
+            i += 2
+            continue
+        if code == L:
+            x, y = coords[i:i + 2]
+            line_points.append((x, y))
+            i += 2
+            continue
+        if code == Z:
+            if (x, y) != (start_x, start_y):
+                line_points.append((start_x, start_y))
+            x, y = start_x, start_y
+            continue
+
+        if line_points:
+            pieces.append(np.array(line_points))
+            line_points = []
+        if code == C:
+            pieces.append((C, len(cubics)))
+            cubics.append((x, y) + tuple(coords[i:i + 6]))
+            x, y = coords[i + 4:i + 6]
+            i += 6
+        elif code == Q:
+            pieces.append((Q, len(quadratics)))
+            quadratics.append((x, y) + tuple(coords[i:i + 4]))
+            x, y = coords[i + 2:i + 4]
+            i += 4
+        elif code == A:
+            rx, ry, angle, large_arc, sweep, x2, y2 = coords[i:i + 7]
+            pieces.append(flatten_arc(x, y, rx, ry, angle, large_arc, sweep, x2, y2, flat))
+            x, y = x2, y2
+            i += 7
+    if line_points:
+        pieces.append(np.array(line_points))
+
+    evaluated = {}
+    if cubics:
+        evaluated[C] = evaluate_cubics(np.array(cubics).reshape(-1, 4, 2), flat)
+    if quadratics:
+        evaluated[Q] = evaluate_quadratics(np.array(quadratics).reshape(-1, 3, 2), flat)
+
+    result = []
+    for pieces in subpaths:
+        arrays = []
+        for piece in pieces:
+            if isinstance(piece, tuple):
+                points, starts, steps = evaluated[piece[0]]
+                start = starts[piece[1]]
+                piece = points[start:start + steps[piece[1]]]
+            arrays.append(piece)
+        result.append(np.concatenate(arrays).reshape(-1, 2))
+    return result
+
+
+def matrix_scale(mat):
+    '''Return the most that a 2x3 or 3x3 transform matrix can stretch a distance'''
+    return np.linalg.norm(np.asarray(mat, dtype=float)[:2, :2], 2)
+
+
+def transform_points(mat, points):
+    '''Return an (n, 2) array of points transformed by a 2x3 or 3x3 transform matrix'''
+    return simpletransform.applyTransformToPoints(mat, points)
+
+
+def transform_flatness(mat, flat):
+    '''
+    Return the tolerance to flatten with before transforming points by mat, so that they are
+    within `flat` of the curve after the transform
+    '''
+    if mat is None:
+        return flat
+    scale = matrix_scale(mat)
+    return flat / scale if scale > 0 else flat
@@ -8,8 +8,8 @@ import xml.etree.ElementTree as ET
 # Internal Imports
 from . import simplepath
 from . import simpletransform 
-from . import cubicsuperpath
-from . import cspsubdiv
+from . import flatten
+from . import bbox
 from .bezmisc import beziersplitatt
 
 # Parent Class
@@ -21,13 +21,37 @@ class svgshape(object):
     def d_path(self):
         raise NotImplementedError
 
-    def transformation_matrix(self):
+    def transformation_matrix(self, parent=None):
+        '''
+        Return the shape's transform attribute as a matrix, composed with the matrix of its
+        parent element if given, or None if there is neither
+        '''
         t = self.xml_node.get('transform')
-        return simpletransform.parseTransform(t) if t is not None else None
+        return simpletransform.composeTransformAttribute(parent, t)
 
     def svg_path(self):
         return "<path d=\"" + self.d_path() + "\"/>"
 
+    def flatten(self, flatness, mode=flatten.ADAPTIVE, parent=None):
+        '''
+        Return a list holding an array of points for each subpath of the shape, flattening
+        curves in the given mode (one of flatten.MODES). parent is the transform matrix of
+        the shape's parent element, if any.
+        '''
+        d = self.d_path()
+        return polylines(d, self.transformation_matrix(parent), flatness, mode) if d else []
+
+    def extents(self, rotation=None, parent=None):
+        '''
+        Return the exact min and max x, y of the shape once transformed, and then rotated by
+        the 2x3 matrix rotation if given, without flattening it. Return None if it has no path.
+        '''
+        d = self.d_path()
+        if not d:
+            return None
+        codes, coords = simplepath.parsePathArrays(d)
+        return bbox.path_extents(codes, coords, bbox.compose(rotation, self.transformation_matrix(parent)))
+
     def __str__(self):
         return str(self.xml_node)        
 
@@ -100,6 +124,17 @@ class ellipse(svgshape):
             '0 1 0 %f,%f' % ( x1, self.cy )
         return p
 
+    def flatten(self, flatness, mode=flatten.ADAPTIVE, parent=None):
+        mat = self.transformation_matrix(parent)
+        points = flatten.flatten_ellipse(
+            self.cx, self.cy, self.rx, self.ry, flatten.transform_flatness(mat, flatness)
+        )
+        return [flatten.transform_points(mat, points) if mat is not None else points]
+
+    def extents(self, rotation=None, parent=None):
+        mat = bbox.compose(rotation, self.transformation_matrix(parent))
+        return bbox.ellipse_extents(self.cx, self.cy, self.rx, self.ry, mat)
+
 # CIRCLE tag
 class circle(ellipse):
     
@@ -179,24 +214,35 @@ class polyline(polycommon):
         return d
 
 #
-def point_generator(path, mat, flatness):
-
-        if len(simplepath.parsePath(path)) == 0:
-                return
-       
-        simple_path = simplepath.parsePath(path)
-        startX,startY = float(simple_path[0][1][0]), float(simple_path[0][1][1])
-        yield startX, startY
-
-        p = cubicsuperpath.parsePath(path)
-        
-        if mat:
-            simpletransform.applyTransformToPath(mat, p)
-
-        for sp in p:
-                cspsubdiv.subdiv( sp, flatness)
-                for csp in sp:
-                    ctrl_pt1 = csp[0]
-                    ctrl_pt2 = csp[1]
-                    end_pt = csp[2]
-                    yield end_pt[0], end_pt[1],    
+def polylines(path, mat, flatness, mode=flatten.ADAPTIVE):
+    '''
+    Flatten svg path data, transformed by mat if given, into a list holding an array of
+    points for each subpath. Curves are flattened in the given mode (one of flatten.MODES).
+    '''
+    codes, coords = simplepath.parsePathArrays(path)
+    if len(codes) == 0:
+        return []
+    return _polylines(codes, coords, mat, flatness, mode)
+
+def _polylines(codes, coords, mat, flatness, mode=flatten.ADAPTIVE):
+    result = flatten.flatten_path(codes, coords, flatten.transform_flatness(mat, flatness), mode)
+
+    if mat is not None:
+        result = [flatten.transform_points(mat, points) for points in result]
+
+    return result
+
+#
+def point_generator(path, mat, flatness, mode=flatten.ADAPTIVE):
+    codes, coords = simplepath.parsePathArrays(path)
+    if len(codes) == 0:
+        return
+
+    start = [coords[0], coords[1]]
+    if mat is not None:
+        simpletransform.applyTransformToPoint(mat, start)
+    yield start[0], start[1]
+
+    for points in _polylines(codes, coords, mat, flatness, mode):
+        for x, y in points.tolist():
+            yield x, y
@@ -21,6 +21,7 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 """
 import re, math
+from array import array
 
 def lexPath(d):
     """
@@ -163,6 +164,133 @@ def parsePath(d):
         retval.append([outputCommand,params])
     return retval
 
+# A single pattern for the whole of a path's data: each match is a command, a parameter or
+# (if neither) an invalid character. Delimiters are skipped between matches.
+pathToken = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]|[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?|[^ \t\r\n,]')
+pathCommands = frozenset('MLHVCSQTAZmlhvcsqtaz')
+
+# Number of parameters of each command in the output of parsePathArrays, keyed by command code
+arrayParams = {ord('M'): 2, ord('L'): 2, ord('C'): 6, ord('Q'): 4, ord('A'): 7, ord('Z'): 0}
+
+def parsePathArrays(d):
+    """
+    Parse SVG path data into compact arrays, with the same semantics as parsePath.
+    Returns (codes, coords): an array('B') holding the ASCII code of each segment's
+    command (one of M, L, C, Q, A and Z), and an array('d') holding all of their
+    parameters in order (see arrayParams).
+    """
+    codes = array('B')
+    coords = array('d')
+    tokens = pathToken.findall(d)
+    commandIndices = [i for i, token in enumerate(tokens) if token in pathCommands]
+    if not tokens:
+        return codes, coords
+    if not commandIndices or commandIndices[0] != 0:
+        parseParams(tokens[:1])
+        raise Exception('Invalid path, no initial command.')
+    if tokens[0].upper() != 'M':
+        raise Exception('Invalid path, must begin with moveto.')
+    commandIndices.append(len(tokens))
+
+    pen = (0.0, 0.0)
+    subPathStart = pen
+    lastControl = pen
+
+    for k in range(len(commandIndices) - 1):
+        start, end = commandIndices[k], commandIndices[k + 1]
+        command = tokens[start]
+        values = parseParams(tokens[start + 1:end])
+        numValues = len(values)
+        numParams = pathdefs[command.upper()][1]
+        if numParams == 0:
+            # closepath, maybe followed by the parameters of its implicit next command
+            codes.append(ord('Z'))
+            pen = lastControl = subPathStart
+            if not numValues:
+                continue
+            command = 'L' if command.isupper() else 'l'
+            numParams = 2
+        elif not numValues:
+            raise Exception('Invalid number of parameters' if end < len(tokens) else 'Unexpected end of path')
+        if numValues % numParams:
+            numValues -= numValues % numParams
+            error = 'Invalid number of parameters' if end < len(tokens) else 'Unexpected end of path'
+        else:
+            error = None
+
+        if command in 'MLCQ':
+            # absolute commands are copied as they are
+            if command == 'M':
+                subPathStart = tuple(values[0:2])
+                codes.append(ord('M'))
+                codes.extend(array('B', [ord('L')]) * (numValues // 2 - 1))
+            else:
+                codes.extend(array('B', [ord(command)]) * (numValues // numParams))
+            coords.extend(values[:numValues])
+            pen = tuple(values[numValues - 2:numValues])
+            if command in 'CQ':
+                lastControl = tuple(values[numValues - 4:numValues - 2])
+            else:
+                lastControl = pen
+        else:
+            for j in range(0, numValues, numParams):
+                segment = values[j:j + numParams]
+                outputCommand = command.upper()
+                if command.islower():
+                    if outputCommand == 'A':
+                        segment[5] += pen[0]
+                        segment[6] += pen[1]
+                    elif outputCommand == 'H':
+                        segment[0] += pen[0]
+                    elif outputCommand == 'V':
+                        segment[0] += pen[1]
+                    else:
+                        for n in range(0, numParams, 2):
+                            segment[n] += pen[0]
+                            segment[n + 1] += pen[1]
+
+                #Flesh out shortcut notation
+                if outputCommand == 'H':
+                    segment.append(pen[1])
+                    outputCommand = 'L'
+                elif outputCommand == 'V':
+                    segment.insert(0, pen[0])
+                    outputCommand = 'L'
+                elif outputCommand in ('S','T'):
+                    segment[0:0] = [pen[0] + (pen[0] - lastControl[0]), pen[1] + (pen[1] - lastControl[1])]
+                    outputCommand = 'C' if outputCommand == 'S' else 'Q'
+                elif outputCommand == 'M':
+                    subPathStart = tuple(segment)
+                    #subsequent pairs are implicit linetos
+                    command = 'l'
+
+                pen = tuple(segment[-2:])
+                if outputCommand in ('Q','C'):
+                    lastControl = tuple(segment[-4:-2])
+                else:
+                    lastControl = pen
+                codes.append(ord(outputCommand))
+                coords.extend(segment)
+
+        if error:
+            raise Exception(error)
+    return codes, coords
+
+def segmentsFromArrays(codes, coords):
+    """Yield the segments of parsePathArrays output in the form returned by parsePath"""
+    i = 0
+    for code in codes:
+        numParams = arrayParams[code]
+        yield [chr(code), coords[i:i + numParams].tolist()]
+        i += numParams
+
+def parseParams(tokens):
+    """Return the parameter tokens of a path command as floats"""
+    try:
+        return list(map(float, tokens))
+    except ValueError:
+        raise Exception('Invalid path data!')
+
 def formatPath(a):
     """Format SVG path data from an array"""
     return "".join([cmd + " ".join([str(p) for p in params]) for cmd, params in a])
@@ -22,59 +22,80 @@ This code defines several functions to make handling of transform
 attribute easier.
 '''
 from . import cubicsuperpath, bezmisc 
-import copy, math, re
+import copy, functools, math, re
+import numpy
 
-def parseTransform(transf,mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
-    if transf=="" or transf==None:
-        return(mat)
-    stransf = transf.strip()
-    result=re.match("(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?",stransf)
+# One transform in a transform attribute, and the separators after it
+transformPattern = re.compile(r"\s*(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?")
+# Number of distinct transform attributes whose matrices are kept by parseTransformMatrix
+TRANSFORM_CACHE_SIZE = 4096
+
+def transformMatrix(name, args):
+    """Return the 3x3 matrix of a single transform function as nested lists"""
 #-- translate --
-    if result.group(1)=="translate":
-        args=result.group(2).replace(',',' ').split()
-        dx=float(args[0])
-        if len(args)==1:
-            dy=0.0
-        else:
-            dy=float(args[1])
-        matrix=[[1,0,dx],[0,1,dy]]
+    if name=="translate":
+        dx=args[0]
+        dy=args[1] if len(args)>1 else 0.0
+        return [[1.0,0.0,dx],[0.0,1.0,dy],[0.0,0.0,1.0]]
 #-- scale --
-    if result.group(1)=="scale":
-        args=result.group(2).replace(',',' ').split()
-        sx=float(args[0])
-        if len(args)==1:
-            sy=sx
-        else:
-            sy=float(args[1])
-        matrix=[[sx,0,0],[0,sy,0]]
+    if name=="scale":
+        sx=args[0]
+        sy=args[1] if len(args)>1 else sx
+        return [[sx,0.0,0.0],[0.0,sy,0.0],[0.0,0.0,1.0]]
 #-- rotate --
-    if result.group(1)=="rotate":
-        args=result.group(2).replace(',',' ').split()
-        a=float(args[0])*math.pi/180
-        if len(args)==1:
-            cx,cy=(0.0,0.0)
-        else:
-            cx,cy=list(map(float,args[1:]))
-        matrix=[[math.cos(a),-math.sin(a),cx],[math.sin(a),math.cos(a),cy]]
-        matrix=composeTransform(matrix,[[1,0,-cx],[0,1,-cy]])
+    if name=="rotate":
+        a=args[0]*math.pi/180
+        cx,cy=(args[1],args[2]) if len(args)>2 else (0.0,0.0)
+        c,s=math.cos(a),math.sin(a)
+        # rotation about (cx, cy): translate(cx, cy) rotate(a) translate(-cx, -cy)
+        return [[c,-s,cx-c*cx+s*cy],[s,c,cy-s*cx-c*cy],[0.0,0.0,1.0]]
 #-- skewX --
-    if result.group(1)=="skewX":
-        a=float(result.group(2))*math.pi/180
-        matrix=[[1,math.tan(a),0],[0,1,0]]
+    if name=="skewX":
+        return [[1.0,math.tan(args[0]*math.pi/180),0.0],[0.0,1.0,0.0],[0.0,0.0,1.0]]
 #-- skewY --
-    if result.group(1)=="skewY":
-        a=float(result.group(2))*math.pi/180
-        matrix=[[1,0,0],[math.tan(a),1,0]]
+    if name=="skewY":
+        return [[1.0,0.0,0.0],[math.tan(args[0]*math.pi/180),1.0,0.0],[0.0,0.0,1.0]]
 #-- matrix --
-    if result.group(1)=="matrix":
-        a11,a21,a12,a22,v1,v2=result.group(2).replace(',',' ').split()
-        matrix=[[float(a11),float(a12),float(v1)], [float(a21),float(a22),float(v2)]]
+    a11,a21,a12,a22,v1,v2=args
+    return [[a11,a12,v1],[a21,a22,v2],[0.0,0.0,1.0]]
 
-    matrix=composeTransform(mat,matrix)
-    if result.end() < len(stransf):
-        return(parseTransform(stransf[result.end():], matrix))
-    else:
-        return matrix
+@functools.lru_cache(maxsize=TRANSFORM_CACHE_SIZE)
+def parseTransformMatrix(transf):
+    """
+    Return the transform attribute transf as a read-only 3x3 numpy array. Parsed matrices are
+    cached by attribute string, as generated drawings tend to repeat a few transforms many times.
+    """
+    mat = numpy.identity(3)
+    stransf = transf.strip()
+    pos = 0
+    while pos < len(stransf):
+        result = transformPattern.match(stransf, pos)
+        if result is None:
+            raise ValueError('Invalid transform: %r' % transf)
+        args = [float(arg) for arg in result.group(2).replace(',',' ').split()]
+        mat = mat @ numpy.array(transformMatrix(result.group(1), args))
+        pos = result.end()
+    mat.setflags(write=False)
+    return mat
+
+def parseTransform(transf,mat=None):
+    """Return mat (the identity if None) composed with transf, as a 2x3 matrix of nested lists"""
+    if mat is None:
+        mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+    if transf=="" or transf==None:
+        return(mat)
+    return composeTransform(mat, parseTransformMatrix(transf)[:2].tolist())
+
+def composeTransformAttribute(mat, transf):
+    """
+    Return the 3x3 numpy matrix mat composed with the transform attribute transf, where None
+    stands for the identity matrix or a missing attribute
+    """
+    if not transf:
+        return mat
+    if mat is None:
+        return parseTransformMatrix(transf)
+    return mat @ parseTransformMatrix(transf)
 
 def formatTransform(mat):
     return ("matrix(%f,%f,%f,%f,%f,%f)" % (mat[0][0], mat[1][0], mat[0][1], mat[1][1], mat[0][2], mat[1][2]))
@@ -108,11 +129,21 @@ def applyTransformToPoint(mat,pt):
     pt[0]=x
     pt[1]=y
 
+def applyTransformToPoints(mat,points):
+    """Return an (n, 2) array of points transformed by a 2x3 or 3x3 matrix"""
+    mat = numpy.asarray(mat, dtype=float)
+    return points @ mat[:2, :2].T + mat[:2, 2]
+
 def applyTransformToPath(mat,path):
-    for comp in path:
-        for ctl in comp:
-            for pt in ctl:
-                applyTransformToPoint(mat,pt)
+    if isinstance(path, cubicsuperpath.CompactSuperPath):
+        path.transform(mat)
+        return
+    pts = [pt for comp in path for ctl in comp for pt in ctl]
+    if not pts:
+        return
+    for pt, (x, y) in zip(pts, applyTransformToPoints(mat, numpy.array(pts, dtype=float)).tolist()):
+        pt[0]=x
+        pt[1]=y
 
 def fuseTransform(node):
     if node.get('d')==None:
@@ -141,6 +172,10 @@ def boxunion(b1,b2):
         return((min(b1[0],b2[0]), max(b1[1],b2[1]), min(b1[2],b2[2]), max(b1[3],b2[3])))
 
 def roughBBox(path):
+    if isinstance(path, cubicsuperpath.CompactSuperPath):
+        xmin,ymin = path.nodes.reshape(-1, 2).min(axis=0).tolist()
+        xMax,yMax = path.nodes.reshape(-1, 2).max(axis=0).tolist()
+        return xmin,xMax,ymin,yMax
     xmin,xMax,ymin,yMax = path[0][0][0][0],path[0][0][0][0],path[0][0][0][1],path[0][0][0][1]
     for pathcomp in path:
         for ctl in pathcomp:
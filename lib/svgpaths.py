@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+svgpaths.py
+Loading the shapes of an SVG for route optimisation without building svgpathtools objects.
+
+Ordering the paths of a drawing only needs to know where each one starts and ends, so a
+CompactDrawing keeps just those, in numpy arrays of complex numbers as svgpathtools uses, along
+with each shape's path data and transform. A route through it is a list of PathHandles, light
+stand-ins for svgpathtools paths that have the same start, end and reversed(), and which can be
+joined together. The path data of each shape is only parsed again as a CompactSuperPath when
+the route is written out.
+"""
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from . import shapes, simplepath, simpletransform
+from .cubicsuperpath import CompactSuperPath, formatPath
+from .flatten import M, Z
+
+# The number of parameters of each command code in the output of simplepath.parsePathArrays
+PARAM_COUNTS = np.zeros(256, dtype=np.int64)
+for code, count in simplepath.arrayParams.items():
+    PARAM_COUNTS[code] = count
+
+# Attributes of the root svg element that are copied to a written file
+SVG_ATTRIBUTES = ('width', 'height', 'viewBox')
+
+
+def path_ends(codes, coords):
+    '''Return the x, y of the start and of the end of the output of simplepath.parsePathArrays'''
+    start = (coords[0], coords[1])
+    if codes[-1] != Z:
+        return start, (coords[-2], coords[-1])
+    # a closed path ends where its last subpath started
+    last_move = codes.tobytes().rfind(bytes((M,)))
+    i = int(PARAM_COUNTS[np.frombuffer(codes, dtype=np.uint8)[:last_move]].sum())
+    return start, (coords[i], coords[i + 1])
+
+
+class PathHandle(object):
+    '''
+    One or more paths of a CompactDrawing, given as a tuple of (path index, reversed) pairs,
+    drawn one after another with straight lines between them. start and end are complex
+    numbers, as for svgpathtools paths.
+    '''
+    __slots__ = ('parts', 'start', 'end')
+
+    def __init__(self, parts, start, end):
+        self.parts = parts
+        self.start = start
+        self.end = end
+
+    def reversed(self):
+        parts = tuple((index, not reverse) for index, reverse in reversed(self.parts))
+        return PathHandle(parts, self.end, self.start)
+
+    @classmethod
+    def joined(cls, handles):
+        '''Return a handle for drawing handles one after another'''
+        parts = tuple(part for handle in handles for part in handle.parts)
+        return cls(parts, handles[0].start, handles[-1].end)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __repr__(self):
+        return 'PathHandle(%r)' % (self.parts,)
+
+
+class CompactDrawing(object):
+    '''
+    The shapes of an SVG as path data and transforms, with where each starts and ends in
+    `starts` and `ends`, complex arrays in the SVG's user units once transformed.
+    '''
+    def __init__(self, paths, mats, starts, ends, svg_attributes):
+        self.paths = paths
+        self.mats = mats
+        self.starts = starts
+        self.ends = ends
+        self.svg_attributes = svg_attributes
+
+    @classmethod
+    def fromElements(cls, elements, tags):
+        '''
+        Load the shapes from an iterable of (element, parent matrix) pairs, such as
+        svg2gcode.walk_elements yields, whose tags (without namespace) are in tags. The
+        attributes of the first element are kept as those of the svg.
+        '''
+        paths = []
+        mats = []
+        points = []
+        svg_attributes = None
+        for elem, parent_mat in elements:
+            if svg_attributes is None:
+                svg_attributes = {name: elem.get(name) for name in SVG_ATTRIBUTES if elem.get(name)}
+            tag = elem.tag.split('}')[-1]
+            if tag not in tags:
+                continue
+            shape = getattr(shapes, tag)(elem)
+            d = shape.d_path()
+            if not d:
+                continue
+            codes, coords = simplepath.parsePathArrays(d)
+            if len(codes) == 0:
+                continue
+            paths.append(d)
+            mats.append(shape.transformation_matrix(parent_mat))
+            points.extend(path_ends(codes, coords))
+
+        points = np.array(points, dtype=float).reshape(-1, 2)
+        # shapes in the same group share their parent's matrix, so are transformed together
+        groups = {}
+        for k, mat in enumerate(mats):
+            if mat is not None:
+                groups.setdefault(id(mat), (mat, []))[1].append(k)
+        for mat, indices in groups.values():
+            rows = np.column_stack((np.multiply(indices, 2), np.multiply(indices, 2) + 1)).ravel()
+            points[rows] = simpletransform.applyTransformToPoints(mat, points[rows])
+        complex_points = points[:, 0] + 1j * points[:, 1]
+        return cls(paths, mats, complex_points[0::2], complex_points[1::2], svg_attributes or {})
+
+    def __len__(self):
+        return len(self.paths)
+
+    def handles(self):
+        '''Return a PathHandle for each path, drawn forwards'''
+        return [
+            PathHandle(((k, False),), start, end)
+            for k, (start, end) in enumerate(zip(self.starts.tolist(), self.ends.tolist()))
+        ]
+
+    def superpath(self, index, reverse=False):
+        '''Return path index as a CompactSuperPath in user units, drawn backwards if reverse'''
+        csp = CompactSuperPath.parsePath(self.paths[index])
+        if self.mats[index] is not None:
+            csp.transform(self.mats[index])
+        return csp.reversed() if reverse else csp
+
+    def pathData(self, handle):
+        '''Return svg path data for a PathHandle'''
+        return formatPath(CompactSuperPath.joined([self.superpath(*part) for part in handle.parts]))
+
+    def pathAttributes(self, handle):
+        '''
+        Return the attributes of a path element for a PathHandle. A single path drawn forwards
+        keeps its own path data and transform, so it needn't be parsed again.
+        '''
+        attributes = {'fill': 'none', 'stroke': 'black'}
+        if len(handle.parts) == 1 and not handle.parts[0][1]:
+            index = handle.parts[0][0]
+            attributes['d'] = self.paths[index]
+            if self.mats[index] is not None:
+                attributes['transform'] = 'matrix(%r %r %r %r %r %r)' % tuple(np.asarray(self.mats[index])[:2].T.ravel().tolist())
+        else:
+            attributes['d'] = self.pathData(handle)
+        return attributes
+
+    def write(self, route, filename):
+        '''Write a list of PathHandles to an svg file, one path element each'''
+        svg = ET.Element('svg', dict(self.svg_attributes, xmlns='http://www.w3.org/2000/svg'))
+        for handle in route:
+            ET.SubElement(svg, 'path', self.pathAttributes(handle))
+        ET.ElementTree(svg).write(filename, encoding='utf-8', xml_declaration=True)
@@ -1,78 +1,236 @@
 #!/usr/bin/env python3
 import argparse
+import time
 from os.path import splitext
 
-from svgpathtools import svg2paths, wsvg
+import numpy as np
+
+from svgpathtools import Line, Path, parse_path, svg2paths, wsvg
 
 from penkit_optimize.greedy import greedy_walk
 from penkit_optimize.path_graph import PathGraph
 from penkit_optimize.svg import load_paths
 from penkit_optimize.visualize import visualize_pen_transits
-from penkit_optimize.route_util import get_route_from_solution, join_close_paths, cost_of_route
+from penkit_optimize.route_util import get_route_from_solution, join_close_paths
 from penkit_optimize.vrp_solver import vrp_solver
 
-DEFAULT_MERGE_THRESHOLD = 1.0
+from lib.svgpaths import CompactDrawing, PathHandle
+from svg2gcode import SVG_TAGS, open_svg, stream_elements
+from utils import chain_paths, grid_greedy_walk, improve_route
 
+DEFAULT_MERGE_THRESHOLD = 1.0
+DEFAULT_TIME_LIMIT = 10.0
+# The VRP solver builds a model with a node for each direction of each path, so above this
+# many paths the greedy solver is used instead
+DEFAULT_VRP_MAX_PATHS = 2000
+
+SOLVERS = ('greedy', 'vrp')
+
+# Ways of merging paths: only those one after another in the optimised route, or any with
+# nearby ends, chained before the route is optimised
+MERGE_MODES = ('adjacent', 'chain')
+
+# Ways of loading the paths of an SVG: as svgpathtools objects, or as only their start and end
+# points with a handle on their path data (see lib.svgpaths), which is much faster
+LOADERS = ('compact', 'svgpathtools')
+
+# Ways of finding the nearest path end in the greedy walk
+GREEDY_WALKS = {
+    'rtree': greedy_walk,
+    'grid': grid_greedy_walk,
+}
+
+
+def route_cost(route, origin=0j):
+    '''
+    Return the pen-up travel of a list of paths, from the origin and back, as penkit's
+    cost_of_route does but from arrays of their ends
+    '''
+    starts = np.array([path.start for path in route] + [origin])
+    ends = np.array([origin] + [path.end for path in route])
+    return float(np.abs(starts - ends).sum())
+
+
+def join_paths(paths):
+    '''Return svgpathtools paths joined end to start by straight lines into one path'''
+    segments = []
+    for path in paths:
+        if segments and segments[-1].end != path.start:
+            segments.append(Line(segments[-1].end, path.start))
+        segments.extend(path)
+    return Path(*segments)
+
+
+def chain_close_paths(paths, threshold, join=join_paths):
+    '''
+    Join paths whose ends are less than threshold apart into single paths, wherever they are
+    in the drawing and reversing them where needed (see utils.chain_paths). Each chain of
+    paths is joined into one by join.
+    '''
+    chains = chain_paths(
+        [(path.start.real, path.start.imag) for path in paths],
+        [(path.end.real, path.end.imag) for path in paths],
+        threshold,
+    )
+    return [join([paths[k].reversed() if reverse else paths[k] for k, reverse in chain]) for chain in chains]
+
+
+def join_adjacent_paths(route, threshold, join):
+    '''
+    Join each run of paths in route in which each starts less than threshold from the end of
+    the one before, as penkit's join_close_paths does, joining each run into one path by join
+    '''
+    if not route:
+        return []
+    runs = [[route[0]]]
+    for path in route[1:]:
+        if abs(runs[-1][-1].end - path.start) < threshold:
+            runs[-1].append(path)
+        else:
+            runs.append([path])
+    return [join(run) for run in runs]
+
+
+def load_compact(input_file):
+    '''Return a CompactDrawing of the shapes in an svg file, parsed as it is read'''
+    with open_svg(input_file) as svg_file:
+        return CompactDrawing.fromElements(stream_elements(svg_file), SVG_TAGS)
+
+
+def optimise_route(paths, greedy='rtree', time_limit=DEFAULT_TIME_LIMIT, solver='greedy',
+                   vrp_max_paths=DEFAULT_VRP_MAX_PATHS):
+    '''
+    Return paths, anything with a start, an end and reversed() such as svgpathtools paths or
+    PathHandles, reordered and reversed to shorten the pen-up travel between them
+    '''
+    start = time.perf_counter()
+    path_graph = PathGraph(paths)
+    greedy_solution = list(GREEDY_WALKS[greedy](path_graph))
+    greedy_route = get_route_from_solution(greedy_solution, path_graph)
+    greedy_seconds = time.perf_counter() - start
+
+    greedy_cost = route_cost(greedy_route)
+    print('Cost after greedy optimization: {} ({} index, {:.2f}s)'.format(greedy_cost, greedy, greedy_seconds))
+
+    route = greedy_route
+    solution = greedy_solution
+
+    if solver == 'vrp' and len(paths) > vrp_max_paths:
+        print('{} paths is more than --vrp-max-paths {}, using the greedy solver'.format(len(paths), vrp_max_paths))
+        solver = 'greedy'
+
+    if time_limit > 0:
+        start = time.perf_counter()
+        solution = improve_route(greedy_solution, path_graph, time_limit)
+        route = get_route_from_solution(solution, path_graph)
+        print('Cost after local search: {} ({:.2f}s)'.format(route_cost(route), time.perf_counter() - start))
+
+    if solver == 'vrp':
+        # seeded with the greedy route, improved if there was time, so it can only get better
+        start = time.perf_counter()
+        # or-tools takes a whole number of seconds, and is given at least one even with -t 0
+        solution = vrp_solver(path_graph, solution, max(1, round(time_limit)))
+        print()
+        route = get_route_from_solution(solution, path_graph)
+        print('Cost after VRP solver: {} ({:.2f}s)'.format(route_cost(route), time.perf_counter() - start))
+
+    print('Solver: {}{}'.format(solver, '' if time_limit > 0 else ', without local search'))
+    return route
+
+
+def run_optimizer(input_file, output_file, vis_output, noopt, merge_paths, greedy='rtree',
+                  time_limit=DEFAULT_TIME_LIMIT, solver='greedy', vrp_max_paths=DEFAULT_VRP_MAX_PATHS,
+                  merge_mode='adjacent', loader='compact'):
+    start = time.perf_counter()
+    if loader == 'compact':
+        drawing = load_compact(input_file)
+        paths = drawing.handles()
+    else:
+        drawing = None
+        paths, attributes, svg_attributes = svg2paths(input_file, return_svg_attributes=True)
+    print('Loaded {} paths ({} loader, {:.2f}s)'.format(len(paths), loader, time.perf_counter() - start))
 
-def run_optimizer(input_file, output_file, vis_output, noopt, merge_paths):
-    paths, attributes, svg_attributes = svg2paths(input_file, return_svg_attributes=True)
+    if merge_paths is None:
+        merge_paths = DEFAULT_MERGE_THRESHOLD
 
-    initial_cost = cost_of_route(paths)
+    initial_cost = route_cost(paths)
     print('Initial cost: {}'.format(initial_cost))
 
+    join = PathHandle.joined if drawing is not None else join_paths
+    if merge_paths is not False and merge_mode == 'chain':
+        print('Paths before chaining: {}'.format(len(paths)))
+        start = time.perf_counter()
+        paths = chain_close_paths(paths, merge_paths, join)
+        print('Paths after chaining: {} ({:.2f}s)'.format(len(paths), time.perf_counter() - start))
+
     if noopt:
         route = paths
     else:
-        path_graph = PathGraph(paths)
-        greedy_solution = list(greedy_walk(path_graph))
-        greedy_route = get_route_from_solution(greedy_solution, path_graph)
-
-        greedy_cost = cost_of_route(greedy_route)
-        print('Cost after greedy optimization: {}'.format(greedy_cost))
-
-        route = greedy_route
+        route = optimise_route(paths, greedy, time_limit, solver, vrp_max_paths)
 
-        if merge_paths is not False:
-            if merge_paths is None:
-                threshold = DEFAULT_MERGE_THRESHOLD
-            else:
-                threshold = merge_paths
+        if merge_paths is not False and merge_mode == 'adjacent':
             print('Routes before merging: {}'.format(len(route)))
-            route = join_close_paths(route, threshold)
-            print('Routes after merging: {}'.format(len(route)))
+            start = time.perf_counter()
+            if drawing is not None:
+                route = join_adjacent_paths(route, merge_paths, join)
+            else:
+                route = join_close_paths(route, merge_paths)
+            print('Routes after merging: {} ({:.2f}s)'.format(len(route), time.perf_counter() - start))
 
     if output_file is None:
         output_file = splitext(input_file)[0] + '-optimized.svg'
 
     print('Writing results to {}'.format(output_file))
 
-    svg_attributes["debug"] = False
-
-    wsvg(
-        route, 
-        filename=output_file,
-        # margin_size,
-        # dimensions,
-        # viewbox,
-        # attributes = attributes,
-        svg_attributes=svg_attributes,
-    )
+    if drawing is not None:
+        drawing.write(route, output_file)
+    else:
+        svg_attributes["debug"] = False
+
+        wsvg(
+            route, 
+            filename=output_file,
+            # margin_size,
+            # dimensions,
+            # viewbox,
+            # attributes = attributes,
+            svg_attributes=svg_attributes,
+        )
 
     if vis_output is not None:
         print('Writing visualization to {}'.format(vis_output))
+        if drawing is not None:
+            route = [parse_path(drawing.pathData(handle)) for handle in route]
         visualize_pen_transits(route, vis_output)
 
 
+def add_route_arguments(parser):
+    '''Add the arguments that control how a route is optimised and its paths merged to parser'''
+    parser.add_argument('--merge-paths', '-m', nargs='?',
+                        type=float, default=False, help='Merge paths that start/end near each other. You may optionally specify a threshold distance (in document units) after this parameter.')
+    parser.add_argument('--merge-mode', choices=MERGE_MODES, default='adjacent',
+                        help="Merge only paths that follow each other in the optimised route ('adjacent'), or chain together any paths with ends within the threshold before optimising ('chain'), which leaves fewer pen lifts.")
+    parser.add_argument('--greedy', choices=GREEDY_WALKS, default='rtree',
+                        help="Index path ends for the greedy optimization in penkit's 'rtree', or in a uniform 'grid', which is faster for large numbers of paths.")
+    parser.add_argument('--solver', choices=SOLVERS, default='greedy',
+                        help="Improve the greedy route by local search, or by local search and then or-tools' vehicle routing solver, which is much slower but gets closer to the best route for small drawings.")
+    parser.add_argument('--time-limit', '-t', type=float, default=DEFAULT_TIME_LIMIT,
+                        help="Spend up to this many seconds on local search, and as long again on the VRP solver. Ctrl-C stops local search early (default: %(default)s, 0 to skip local search; the VRP solver always gets at least 1s).")
+    parser.add_argument('--vrp-max-paths', type=int, default=DEFAULT_VRP_MAX_PATHS,
+                        help="Use the greedy solver for drawings with more than this many paths (default: %(default)s).")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('input_file')
     parser.add_argument('output_file', nargs='?')
-    parser.add_argument('--merge-paths', '-m', nargs='?',
-                        type=float, default=False, help='Merge paths that start/end near each other. You may optionally specify a threshold distance (in document units) after this parameter.')
     parser.add_argument(
         '--vis-output', '-v', help='If provided, save a visualization of the path to this SVG file.')
     parser.add_argument('--noopt', '-n', action='store_true',
                         help="Don't run any optimization.")
+    parser.add_argument('--loader', choices=LOADERS, default='compact',
+                        help="Load only the start and end of each path, and its path data to write out once the route is found ('compact'), or build svgpathtools objects for every path ('svgpathtools').")
+    add_route_arguments(parser)
 
     args = parser.parse_args()
     run_optimizer(**vars(args))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Optimise the route through the shapes of an SVG and convert it to G-code in one go.
+
+The shapes are flattened once, as svg2gcode.py does in the 'flattened' bbox mode, and the
+flattened subpaths are reordered, and reversed where that helps, by optimise_svg.py's route
+optimiser before they are mapped onto the plot bed and written. No optimised SVG is written
+out and parsed again in between.
+"""
+
+import argparse
+import importlib
+import sys
+import time
+
+import numpy as np
+
+from lib import bbox
+from lib.svgpaths import PathHandle
+from optimise_svg import (
+    DEFAULT_MERGE_THRESHOLD, DEFAULT_TIME_LIMIT, DEFAULT_VRP_MAX_PATHS, add_route_arguments,
+    chain_close_paths, join_adjacent_paths, optimise_route, route_cost,
+)
+from svg2gcode import PointOutOfRangeError, SVG2GCodeConverter, add_conversion_arguments, gcode_path_for
+
+parser = argparse.ArgumentParser(description='Take an svg input, optimise the order in which its '
+    'shapes are plotted and convert it to gcode commands, as optimise_svg.py and svg2gcode.py do '
+    'but without writing the optimised svg.'
+)
+parser.add_argument('svg_path')
+add_conversion_arguments(parser)
+parser.add_argument('--jobs', type=int, default=1, help="format shapes in this many worker processes")
+add_route_arguments(parser)
+
+
+class OptimisingConverter(SVG2GCodeConverter):
+    """
+    An SVG2GCodeConverter that plots the flattened shapes in an optimised order.
+
+    Shapes are always flattened while measuring the bounding box, in the 'flattened' bbox mode,
+    so that they can be reordered before any are written. Each subpath is routed on its own,
+    on its ends, which are noted as it is kept; its points stay in the PolylineStore, which
+    may spill them to disk, and are read back one shape at a time in the order of the route.
+    Overlaps are removed once the shapes are in that order.
+    Distances for merging paths are in SVG user units, once the SVG's transforms are applied.
+    """
+    def __init__(self, *args, merge_paths=False, merge_mode='adjacent', greedy='rtree',
+                 time_limit=DEFAULT_TIME_LIMIT, solver='greedy', vrp_max_paths=DEFAULT_VRP_MAX_PATHS,
+                 **kwargs):
+        self.merge_paths = DEFAULT_MERGE_THRESHOLD if merge_paths is None else merge_paths
+        self.merge_mode = merge_mode
+        self.route_options = dict(greedy=greedy, time_limit=time_limit, solver=solver, vrp_max_paths=vrp_max_paths)
+        # the start and end of each kept shape, as complex numbers as penkit has them
+        self.starts = []
+        self.ends = []
+        kwargs['bbox_mode'] = bbox.FLATTENED
+        super().__init__(*args, **kwargs)
+
+    def keep_polyline(self, points):
+        super().keep_polyline(points)
+        (x0, y0), (x1, y1) = points[[0, -1]].tolist()
+        self.starts.append(complex(x0, y0))
+        self.ends.append(complex(x1, y1))
+
+    def iter_polylines(self):
+        '''
+        Return an iterator over the flattened shapes in the order of an optimised route, joined
+        where merged, less any overlaps if overlap_tolerance_mm is set
+        '''
+        polylines = self.iter_routed(self.optimise_route())
+        if self.overlap_tolerance_mm:
+            polylines = self.remove_overlaps(polylines)
+        return polylines
+
+    def optimise_route(self):
+        '''Return a list of PathHandles of the kept shapes, in an optimised order'''
+        if not self.starts:
+            return []
+        paths = [PathHandle(((k, False),), start, end) for k, (start, end) in enumerate(zip(self.starts, self.ends))]
+        print('Initial cost: {}'.format(route_cost(paths)))
+
+        if self.merge_paths is not False and self.merge_mode == 'chain':
+            start = time.perf_counter()
+            paths = chain_close_paths(paths, self.merge_paths, PathHandle.joined)
+            print('Paths after chaining: {} ({:.2f}s)'.format(len(paths), time.perf_counter() - start))
+
+        route = optimise_route(paths, **self.route_options)
+
+        if self.merge_paths is not False and self.merge_mode == 'adjacent':
+            start = time.perf_counter()
+            route = join_adjacent_paths(route, self.merge_paths, PathHandle.joined)
+            print('Routes after merging: {} ({:.2f}s)'.format(len(route), time.perf_counter() - start))
+        return route
+
+    def iter_routed(self, route):
+        '''Yield the points of each PathHandle in route, read back from the store'''
+        for handle in route:
+            parts = [self.polylines[k][::-1] if reverse else self.polylines[k] for k, reverse in handle.parts]
+            yield parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    _settings = importlib.import_module(args.settings)
+    kwargs = vars(args)
+    kwargs['settings'] = _settings
+    gcode_path = gcode_path_for(kwargs['svg_path'])
+    print('Output File: ' + gcode_path)
+    kwargs['gcode_path'] = gcode_path
+
+    gcode_converter = OptimisingConverter(**kwargs)
+    try:
+        gcode_converter.convert()
+    except PointOutOfRangeError as error:
+        print(f'\t--POINT OUT OF RANGE: {error.point}')
+        sys.exit(1)
@@ -16,6 +16,38 @@ feed_rate = 5000.00
 #     Smaller the value greater the sharpness.
 smoothness = 0.2
 
+# How curves are flattened to within `smoothness`:
+#     'adaptive' splits each curve in half until it is flat enough,
+#     'fixed' evaluates all of a path's curves at once, at a number of steps per curve found
+#     from its control points. 'fixed' is faster but produces a few more points.
+flatten_mode = 'adaptive'
+
+# Number of decimal places written for G-code coordinates
+precision = 3
+
+# How the SVG's bounding box is measured:
+#     'flattened' measures the points of the flattened shapes, which are kept for output,
+#     'analytic' measures the shapes' curves exactly in a quicker pre-pass, and flattens them
+#     only as the G-code is written, so nothing is kept in between.
+bbox_mode = 'flattened'
+
+# Lines that retrace lines already plotted to within this many mm, such as the shared edges of
+#     tiles or repeated hatching, are left out. 0 plots everything as it is drawn.
+overlap_tolerance_mm = 0
+
+# Points of the plotted shapes within this many mm of the line through the points either side
+#     are left out (Ramer-Douglas-Peucker), so that grbl isn't sent many tiny moves. 0 plots
+#     every flattened point.
+simplify_tolerance_mm = 0
+
+# Runs of plotted points within this many mm of a circular arc are plotted as one G02/G03 arc
+#     move, which grbl draws more smoothly than many short lines. 0 plots only lines.
+arc_tolerance_mm = 0
+
+# Flattened shapes are kept between the bounding box pass and G-code output. Beyond this
+#     many points they are spilled to a temporary file rather than held in memory.
+polyline_store_max_points = 5_000_000
+
 TOOL_ON_CMD = 'M03 S55 (pen down)'
 TOOL_OFF_CMD = 'M03 S35 (pen up)'
 
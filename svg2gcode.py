@@ -3,40 +3,163 @@
 Take an SVG file and output a gcode equivalent.
 """
 
+import functools
+import gzip
+import io
 import os
 import sys
 import xml.etree.ElementTree as ET
 import importlib
-from lib import shapes
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from lib import bbox, flatten, shapes, simpletransform
 import numpy as np
-from vectormath import Vector2
-from utils import Rect, rotate
+from utils import OverlapRemover, PolylineStore, Rect, Vec2, affine_matrix, apply_affine, fit_arcs, simplify_polylines
 from math import pi
 
 SVG_TAGS = set(['rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon', 'path'])
 
+# Plot points this close outside the plot bed are treated as rounding errors and clipped to it
+BED_TOLERANCE_MM = 1e-6
+
+# Overlapping lines shorter than this are plotted again rather than lifting the pen around them
+MIN_OVERLAP_MM = 1.0
+
+# Arcs of larger radii than this are plotted as lines, as grbl loses precision on them
+MAX_ARC_RADIUS_MM = 1000.0
+
+# With --jobs, shapes are sent to worker processes in chunks of about this many characters of
+# SVG attributes to flatten, and this many points to format.
+SHAPE_CHUNK_SIZE = 1 << 20
+POLYLINE_CHUNK_SIZE = 1 << 18
+
+# Settings that settings files written before they were added may not have, and the values
+# used for them then
+DEFAULT_POLYLINE_STORE_MAX_POINTS = 5_000_000
+DEFAULT_PRECISION = 3
+DEFAULT_FLATTEN_MODE = flatten.ADAPTIVE
+DEFAULT_BBOX_MODE = bbox.FLATTENED
+DEFAULT_OVERLAP_TOLERANCE_MM = 0.0
+DEFAULT_SIMPLIFY_TOLERANCE_MM = 0.0
+DEFAULT_ARC_TOLERANCE_MM = 0.0
+
 import argparse
 parser = argparse.ArgumentParser(description='Take an svg input and convert to gcode commands, '
     'using the parameters set in settings.py. By default the input will be maximised in size and '
     'centered in the work area.'
 )
 parser.add_argument('svg_path')
-parser.add_argument('--settings', default='settings', help="use the settings file for a particular machine")
-parser.add_argument('--plot-from-origin', action='store_true', help="position the lower left corner of the output at the corner of the work area")
-parser.add_argument('--x-offset-mm', type=float, default=0.0, help="move the output right by x mm")
-parser.add_argument('--y-offset-mm', type=float, default=0.0, help="move the output up by y mm")
-parser.add_argument('--x-size-mm', type=float, help="set the x size of the output in mm")
-parser.add_argument('--y-size-mm', type=float, help="set the y size of the output in mm")
-parser.add_argument('--rotate', type=float, default=0.0, help="Rotate the SVG (about its origin) by this number of degrees")
+
+
+def add_conversion_arguments(parser):
+    '''Add the arguments that set up an SVG2GCodeConverter, other than its paths, to parser'''
+    parser.add_argument('--settings', default='settings', help="use the settings file for a particular machine")
+    parser.add_argument('--plot-from-origin', action='store_true', help="position the lower left corner of the output at the corner of the work area")
+    parser.add_argument('--x-offset-mm', type=float, default=0.0, help="move the output right by x mm")
+    parser.add_argument('--y-offset-mm', type=float, default=0.0, help="move the output up by y mm")
+    parser.add_argument('--x-size-mm', type=float, help="set the x size of the output in mm")
+    parser.add_argument('--y-size-mm', type=float, help="set the y size of the output in mm")
+    parser.add_argument('--rotate', type=float, default=0.0, help="Rotate the SVG (about its origin) by this number of degrees")
+    parser.add_argument('--stream', action='store_true', help="parse the SVG incrementally, freeing each element once it has been read, so that memory use doesn't grow with the size of the file")
+    parser.add_argument('--bbox-mode', choices=bbox.MODES, help="how to measure the SVG: from its 'flattened' shapes, which are kept until they are written, or from the shapes' curves in an 'analytic' pre-pass, flattening them only as they are written (default: from the settings file)")
+    parser.add_argument('--overlap-tolerance-mm', type=float, help="leave out lines that retrace lines already plotted to within this many mm, 0 to plot everything (default: from the settings file)")
+    parser.add_argument('--simplify-tolerance-mm', type=float, help="leave out points of the plotted shapes that are within this many mm of the line through the points either side, 0 to plot every point (default: from the settings file)")
+    parser.add_argument('--arc-tolerance-mm', type=float, help="plot runs of points that lie within this many mm of a circular arc as one G02/G03 arc move, 0 to plot only straight lines (default: from the settings file)")
+    parser.add_argument('--flatten-mode', choices=flatten.MODES, help="how to flatten curves: 'adaptive' subdivision, or a 'fixed' number of steps per curve found from its control points (default: from the settings file)")
+
+
+add_conversion_arguments(parser)
+parser.add_argument('--jobs', type=int, default=1, help="flatten and format shapes in this many worker processes")
+
+
+def open_svg(svg_path):
+    '''Open an svg file, or a gzipped .svgz file, for reading as bytes'''
+    if svg_path.endswith('.svgz'):
+        return gzip.open(svg_path, 'rb')
+    return open(svg_path, 'rb')
+
+
+def walk_elements(root):
+    '''
+    Yield (element, parent matrix) pairs for every element under and including root, in
+    document order. The parent matrix is the composition of the transform attributes of all of
+    the element's ancestors, or None if none of them has one, and is computed once per element.
+    '''
+    stack = [(root, None)]
+    while stack:
+        elem, parent_mat = stack.pop()
+        yield elem, parent_mat
+        mat = simpletransform.composeTransformAttribute(parent_mat, elem.get('transform'))
+        stack.extend((child, mat) for child in reversed(elem))
+
+
+def stream_elements(svg_file):
+    '''
+    Yield (element, parent matrix) pairs for the elements of an svg file in document order as
+    they are parsed, as walk_elements does. Elements have their attributes but not their
+    children. Each element is freed once it has been closed and its children have been
+    yielded, so the document is never held in memory as a whole.
+    '''
+    parents = []
+    mats = [None]
+    for event, elem in ET.iterparse(svg_file, events=('start', 'end')):
+        if event == 'start':
+            yield elem, mats[-1]
+            parents.append(elem)
+            mats.append(simpletransform.composeTransformAttribute(mats[-1], elem.get('transform')))
+        else:
+            parents.pop()
+            mats.pop()
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+
+def gcode_path_for(svg_path):
+    '''Return the path of the gcode file to write for an svg file'''
+    outdir, input_filename = os.path.split(svg_path)
+    return os.path.join(outdir, input_filename.split('.svg')[0] + '.gcode')
+
+
+def format_moves(points, precision):
+    '''Return G01 moves to each point of an (n, 2) array, with coords to `precision` places'''
+    move = f'G01 X%.{precision}f Y%.{precision}f\n'
+    return (move * len(points)) % tuple(points.ravel().tolist())
+
+
+def format_arc_moves(points, runs, precision):
+    '''
+    Return G01 moves along the line runs and G02/G03 moves along the arc runs that fit_arcs
+    found in an (n, 2) array of points, with coords to `precision` places
+    '''
+    arc = f'G0%d X%.{precision}f Y%.{precision}f I%.{precision}f J%.{precision}f\n'
+    gcode = []
+    for start, end, centre in runs:
+        if centre is None:
+            gcode.append(format_moves(points[start + 1:end + 1], precision))
+            continue
+        # the centre is given relative to the start point as written, so grbl finds the same radius
+        x0, y0 = (round(coord, precision) for coord in points[start].tolist())
+        cx, cy, clockwise, full = centre
+        # grbl draws an arc that ends where it starts all the way round
+        x, y = (x0, y0) if full else points[end].tolist()
+        gcode.append(arc % (2 if clockwise else 3, x, y, cx - x0, cy - y0))
+    return ''.join(gcode)
 
 
 class GCodeFile():
     """
-    Wrapper round a file that writes GCode
+    Wrapper round a file that writes GCode.
+
+    Output is collected in a buffer that is written to the file in chunks of at least
+    buffer_size characters.
     """
-    def __init__(self, filename, settings):
+    def __init__(self, filename, settings, buffer_size=1 << 20):
         '''Open the file and write the preamble'''
         self.settings = settings
+        self.precision = getattr(self.settings, 'precision', DEFAULT_PRECISION)
+        self.buffer_size = buffer_size
+        self.buffer = io.StringIO()
         self.file = open(filename, 'w')
         self.writeln(f'; Generated with `{" ".join(sys.argv)}`')
         self.writeln(self.settings.preamble)
@@ -44,18 +167,235 @@ class GCodeFile():
 
     def write(self, gcode):
         '''Write a string to the file'''
-        self.file.write(gcode)
+        self.buffer.write(gcode)
+        if self.buffer.tell() >= self.buffer_size:
+            self.flush()
 
     def writeln(self, gcode):
         '''Write a string to the file, appending \\n'''
-        self.file.write(gcode + '\n')
+        self.write(gcode + '\n')
+
+    def flush(self):
+        '''Write the buffered G-code to the file and empty the buffer for reuse'''
+        self.file.write(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def abort(self):
+        '''Close the file without writing the postamble or the G-code still buffered'''
+        self.file.close()
 
     def close(self):
         '''Write the postamble and close the file'''
         self.writeln(self.settings.postamble)
+        self.flush()
         self.file.close()
 
 
+class PointOutOfRangeError(ValueError):
+    '''Raised when a shape has a point that isn't on the plot bed'''
+    def __init__(self, point):
+        super().__init__(f'Point out of range: {point}')
+        self.point = point
+
+
+class ShapeFlattener():
+    """
+    Flattens SVG shapes, and measures them once rotated.
+
+    Holds only plain values, so that its methods can be run in worker processes.
+    """
+    def __init__(self, smoothness, flatten_mode, rotate_rads):
+        self.smoothness = smoothness
+        self.flatten_mode = flatten_mode
+        self.rotation = affine_matrix((1.0, 1.0), rotate_rads, (0.0, 0.0))
+        # the same rotation as a 3x3 matrix, to compose with shapes' transforms
+        self.rotation_3x3 = bbox.compose(self.rotation, None)
+
+    def extents(self, points):
+        '''Return the min and max x, y of an (n, 2) array of points after rotation'''
+        rotated = apply_affine(self.rotation, points)
+        return rotated.min(axis=0), rotated.max(axis=0)
+
+    def flatten_chunk(self, chunk):
+        '''
+        Flatten a list of (tag suffix, attributes, parent matrix) tuples of SVG shapes, returning
+        a list of arrays of points for all of their subpaths
+        '''
+        polylines = []
+        for tag_suffix, attributes, parent_mat in chunk:
+            shape_obj = getattr(shapes, tag_suffix)(attributes)
+            polylines.extend(shape_obj.flatten(self.smoothness, self.flatten_mode, parent_mat))
+        return polylines
+
+    def flatten_shapes(self, chunk):
+        '''
+        Flatten a chunk of SVG shapes, as flatten_chunk does. Return the list of arrays of
+        points, and a list of the extents of each array.
+        '''
+        polylines = self.flatten_chunk(chunk)
+        return polylines, [self.extents(points) for points in polylines]
+
+    def measure_shapes(self, chunk):
+        '''
+        Return a list of the exact extents, once rotated, of each shape in a chunk of SVG shapes
+        (see flatten_chunk) that has any, without flattening them
+        '''
+        measured = []
+        for tag_suffix, attributes, parent_mat in chunk:
+            extents = getattr(shapes, tag_suffix)(attributes).extents(self.rotation_3x3, parent_mat)
+            if extents is not None:
+                measured.append(extents)
+        return measured
+
+
+class ShapeFormatter():
+    """
+    Formats G-code for flattened SVG shapes, mapping their points onto the plot bed,
+    simplifying them to within simplify_tolerance_mm if that is set, and replacing runs of
+    points with arcs within arc_tolerance_mm if that is set. flatten_tolerance_mm is how far
+    the lines between flattened points may be from the curves they approximate.
+
+    Holds only plain values, so that its methods can be run in worker processes.
+    """
+    def __init__(self, settings, plot_matrix, plot_bed_mm, simplify_tolerance_mm=0.0, arc_tolerance_mm=0.0,
+                 flatten_tolerance_mm=0.0):
+        self.plot_matrix = plot_matrix
+        self.plot_bed_mm = plot_bed_mm
+        self.simplify_tolerance_mm = simplify_tolerance_mm
+        self.arc_tolerance_mm = arc_tolerance_mm
+        # arcs follow the curves the lines were flattened from, so may be as far from the lines
+        # as the lines are from the curves, after flattening and simplifying
+        self.chord_tolerance_mm = arc_tolerance_mm + flatten_tolerance_mm + simplify_tolerance_mm
+        self.precision = getattr(settings, 'precision', DEFAULT_PRECISION)
+        self.shape_preamble = settings.shape_preamble
+        self.shape_postamble = settings.shape_postamble
+        self.tool_on_cmd = settings.TOOL_ON_CMD
+
+    def plot_shape(self, points):
+        '''
+        Return the flattened points of a single svg shape or subpath mapped onto the plot bed,
+        or raise PointOutOfRangeError if any of them is off it
+        '''
+        plot_points = apply_affine(self.plot_matrix, points)
+
+        # true for the plot points that are within the plot bed
+        in_bed = self.plot_bed_mm.contains(plot_points, BED_TOLERANCE_MM)
+        if not in_bed.all():
+            raise PointOutOfRangeError(plot_points[np.argmin(in_bed)])
+        # points on the edge of the SVG may be outside the bed by a rounding error
+        self.plot_bed_mm.clip_points(plot_points)
+        return plot_points
+
+    def format_plot_points(self, plot_points, runs=None):
+        '''
+        Return the G-code to plot a shape through an array of points on the plot bed, as lines
+        to each point or as the runs of lines and arcs from fit_arcs if given
+        '''
+        gcode = []
+        if self.shape_preamble:
+            gcode.append(self.shape_preamble + '\n')
+        # move to position, put the pen down
+        gcode.append(format_moves(plot_points[:1], self.precision))
+        gcode.append(self.tool_on_cmd + '\n')
+        if runs is None:
+            gcode.append(format_moves(plot_points[1:], self.precision))
+        else:
+            gcode.append(format_arc_moves(plot_points, runs, self.precision))
+        if self.shape_postamble:
+            gcode.append(self.shape_postamble + '\n')
+        return ''.join(gcode)
+
+    def format_shape(self, points):
+        '''
+        Return the G-code for the flattened points of a single svg shape or subpath, or raise
+        PointOutOfRangeError if any of them is off the plot bed
+        '''
+        return self.format_shapes([points])[0]
+
+    def format_shapes(self, chunk):
+        '''
+        Return the G-code for a list of flattened shapes, and the number of moves in it.
+        The shapes are simplified together, which takes far fewer numpy calls than one by one.
+        '''
+        plotted = [self.plot_shape(points) for points in chunk]
+        if self.simplify_tolerance_mm:
+            plotted = simplify_polylines(plotted, self.simplify_tolerance_mm)
+        if not self.arc_tolerance_mm:
+            return ''.join([self.format_plot_points(plot_points) for plot_points in plotted]), sum(len(plot_points) for plot_points in plotted)
+
+        gcode = []
+        move_count = 0
+        for plot_points in plotted:
+            runs = fit_arcs(plot_points, self.arc_tolerance_mm, MAX_ARC_RADIUS_MM, self.chord_tolerance_mm)
+            gcode.append(self.format_plot_points(plot_points, runs))
+            # the first move is to the start of the shape, then one per line or arc
+            move_count += 1 + sum(1 if arc else end - start for start, end, arc in runs)
+        return ''.join(gcode), move_count
+
+
+def shape_chunks(elements, chunk_size):
+    '''
+    Yield lists of (tag suffix, attributes, parent matrix) tuples of the shapes among
+    (element, parent matrix) pairs, in order, with about chunk_size characters of attributes
+    in each list
+    '''
+    chunk = []
+    size = 0
+    for elem, parent_mat in elements:
+        tag_suffix = elem.tag.split('}')[-1]
+        if tag_suffix not in SVG_TAGS:
+            continue
+        attributes = dict(elem.attrib)
+        chunk.append((tag_suffix, attributes, parent_mat))
+        size += 1 + sum(len(value) for value in attributes.values())
+        if size >= chunk_size:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def polyline_chunks(polylines, chunk_size):
+    '''Yield lists of arrays of points from polylines, with about chunk_size points in each list'''
+    chunk = []
+    size = 0
+    for points in polylines:
+        chunk.append(points)
+        size += len(points)
+        if size >= chunk_size:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def flatten_and_format(flattener, formatter, chunk):
+    '''
+    Flatten a chunk of SVG shapes with flattener and format them with formatter in one go,
+    returning the G-code, the number of points flattened and the number of points plotted
+    '''
+    polylines = flattener.flatten_chunk(chunk)
+    gcode, plotted_count = formatter.format_shapes(polylines)
+    return gcode, sum(len(points) for points in polylines), plotted_count
+
+
+def map_in_order(executor, func, chunks, max_pending):
+    '''
+    Yield func(chunk) for each chunk, run in executor, in the order of chunks. No more than
+    max_pending chunks are submitted at once, so that results don't pile up in memory.
+    '''
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(func, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
 class SVG2GCodeConverter():
     def __init__(
         self,
@@ -68,68 +408,93 @@ class SVG2GCodeConverter():
         x_size_mm,
         y_size_mm,
         rotate,
+        flatten_mode=None,
+        bbox_mode=None,
+        overlap_tolerance_mm=None,
+        simplify_tolerance_mm=None,
+        arc_tolerance_mm=None,
+        jobs=1,
+        stream=False,
     ):
 
         # Check File Validity
         if not os.path.isfile(svg_path):
             raise ValueError('File \''+svg_path+'\' not found.')
 
-        if not svg_path.endswith('.svg'):
+        if not svg_path.endswith(('.svg', '.svgz')):
             raise ValueError('File \''+svg_path+'\' is not an SVG file.')
 
         self.settings = settings
         self.svg_path = svg_path
         self.gcode_path = gcode_path
-        self.gcode_file = GCodeFile(self.gcode_path, self.settings)
 
-        # Get the svg Input File
-        input_file = open(self.svg_path, 'r')
-        self.svg_root = ET.parse(input_file).getroot()
-        input_file.close()
+        # Get the svg Input File, unless it is to be streamed
+        self.stream = stream
+        if not self.stream:
+            with open_svg(self.svg_path) as input_file:
+                self.svg_root = ET.parse(input_file).getroot()
 
         self.rotate_rads = rotate * pi / 180
-
+        self.flatten_mode = flatten_mode or getattr(self.settings, 'flatten_mode', DEFAULT_FLATTEN_MODE)
+        self.flattener = ShapeFlattener(self.settings.smoothness, self.flatten_mode, self.rotate_rads)
+
+        # With more than one job, shapes are flattened and formatted in chunks in worker processes
+        self.jobs = jobs
+        self.executor = ProcessPoolExecutor(jobs) if jobs > 1 else None
+
+        # Shapes are either flattened once, while measuring the bounding box, and kept for
+        # convert(), or measured analytically and only flattened by convert()
+        self.bbox_mode = bbox_mode or getattr(self.settings, 'bbox_mode', DEFAULT_BBOX_MODE)
+        self.polylines = PolylineStore(
+            getattr(self.settings, 'polyline_store_max_points', DEFAULT_POLYLINE_STORE_MAX_POINTS)
+        )
+        self.point_count = 0
+        # the number of points formatted as G-code, once overlaps are removed, and the number
+        # of moves they are plotted in, once shapes are simplified and arcs fitted
+        self.formatted_count = 0
+        self.plotted_count = 0
         self.svg_bounding_box = self.get_svg_bounding_box()
 
-        bed_area_mm = Vector2(self.settings.bed_area_mm)
-        self.plot_bed_mm = Rect(Vector2(), bed_area_mm)
-        self.plot_size_mm = Vector2(x_size_mm or bed_area_mm.x, y_size_mm or bed_area_mm.y)
-        self.offset_mm = Vector2(x_offset_mm, y_offset_mm)
+        bed_area_mm = Vec2.of(self.settings.bed_area_mm)
+        self.plot_bed_mm = Rect(Vec2(), bed_area_mm)
+        self.plot_size_mm = Vec2(x_size_mm or bed_area_mm.x, y_size_mm or bed_area_mm.y)
+        self.offset_mm = Vec2(x_offset_mm, y_offset_mm)
         self.plot_from_origin = plot_from_origin
 
-        self.scale, self.offset = self.get_transform()
+        self.overlap_tolerance_mm = overlap_tolerance_mm
+        if self.overlap_tolerance_mm is None:
+            self.overlap_tolerance_mm = getattr(self.settings, 'overlap_tolerance_mm', DEFAULT_OVERLAP_TOLERANCE_MM)
+        self.overlap_remover = None
 
-    def path_to_gcode(self, path, mtx):
-        '''Convert a single svg path to a gcode shape'''
-
-        result = ''
-        new_shape = True
-        points = shapes.point_generator(path, mtx, self.settings.smoothness)
-
-        for point in points:
-            plot_point = self.scale * rotate(Vector2(point), self.rotate_rads) + self.offset
-
-            if self.plot_bed_mm >= plot_point: # true if the plot point is within the plot bed
-                result += f'G01 X{plot_point.x} Y{plot_point.y}\n'
-                if new_shape:
-                    # move to position, put the pen down
-                    result += f'{self.settings.TOOL_ON_CMD}\n'
-                    new_shape = False
-            else:
-                print(f'\t--POINT OUT OF RANGE: {plot_point}')
-                import ipdb as pdb; pdb.set_trace()
-                sys.exit(1)
-        return result
+        self.scale, self.offset = self.get_transform()
+        # rotation, y-flip, scale and offset from SVG coordinates to the plot bed, in one matrix
+        self.plot_matrix = affine_matrix(self.scale, self.rotate_rads, self.offset)
+        self.simplify_tolerance_mm = simplify_tolerance_mm
+        if self.simplify_tolerance_mm is None:
+            self.simplify_tolerance_mm = getattr(self.settings, 'simplify_tolerance_mm', DEFAULT_SIMPLIFY_TOLERANCE_MM)
+        self.arc_tolerance_mm = arc_tolerance_mm
+        if self.arc_tolerance_mm is None:
+            self.arc_tolerance_mm = getattr(self.settings, 'arc_tolerance_mm', DEFAULT_ARC_TOLERANCE_MM)
+        self.formatter = ShapeFormatter(
+            self.settings, self.plot_matrix, self.plot_bed_mm, self.simplify_tolerance_mm, self.arc_tolerance_mm,
+            self.settings.smoothness * abs(self.scale.x),
+        )
+        # opened last, so that an SVG that can't be read leaves no gcode file behind
+        self.gcode_file = GCodeFile(self.gcode_path, self.settings)
 
-    def svg_elem_to_gcode(self, elem):
-        '''Transform an SVG element into gcode'''
+    def svg_elem_to_polylines(self, elem, parent_mat=None):
+        '''
+        Flatten an SVG element into a list of arrays of points in SVG coordinates, one for each
+        subpath. parent_mat is the combined transform of the element's ancestors, if any. The
+        list is empty if the element isn't a shape.
+        '''
         self.debug_log(f'--Found Elem: {elem}')
         tag_suffix = elem.tag.split('}')[-1]
 
         # Checks element is valid SVG_TAGS shape
         if tag_suffix not in SVG_TAGS:
             self.debug_log('  --No Name: '+tag_suffix)
-            return
+            return []
 
         self.debug_log(f'  --Name: {tag_suffix}')
 
@@ -143,52 +508,91 @@ class SVG2GCodeConverter():
         self.debug_log(f'\tTransform: {elem.get("transform")}')
 
         ############ HERE'S THE MEAT!!! #############
-        # Gets the Object path info in one of 2 ways:
-        # 1. Reads the <tag>'s 'd' attribute.
-        # 2. Reads the SVG_TAGS and generates the path itself.
-        d_path = shape_obj.d_path()
-
-        # The *Transformation Matrix* #
-        # Specifies something about how curves are approximated
-        # Non-essential - a default is used if the method below
-        #   returns None.
-        mtx = shape_obj.transformation_matrix()
-
-        if d_path:
-            if self.settings.shape_preamble:
-                self.gcode_file.writeln(self.settings.shape_preamble)
-            self.gcode_file.writeln(self.path_to_gcode(d_path, mtx))
-            if self.settings.shape_postamble:
-                self.gcode_file.writeln(self.settings.shape_postamble)
+        # Flattens the shape into points in one of 2 ways:
+        # 1. Circles and ellipses are flattened directly from their attributes.
+        # 2. Other shapes are flattened from their path info, read from the <tag>'s 'd'
+        #    attribute or generated from its other attributes.
+        # The shape's transform attribute, composed with those of its parent groups, is
+        # applied to the points.
+        polylines = shape_obj.flatten(self.settings.smoothness, self.flatten_mode, parent_mat)
+
+        if not polylines:
+            self.debug_log('\tNO PATH INSTRUCTIONS FOUND!!')
+
+        return polylines
+
+    def iter_elements(self):
+        '''Yield (element, parent matrix) pairs for the SVG file in document order'''
+        if self.stream:
+            with open_svg(self.svg_path) as input_file:
+                yield from stream_elements(input_file)
         else:
-            self.debug_log('\tNO PATH INSTRUCTIONS FOUND!!')            
+            yield from walk_elements(self.svg_root)
 
-    def _get_elem_extents(self, elem):
-        elem_extents = Rect.far_extents()
-        tag_suffix = elem.tag.split('}')[-1]
-        if tag_suffix not in SVG_TAGS:
-            return elem_extents
+    def iter_flattened(self):
+        '''
+        Yield lists of flattened shapes in the SVG file, in document order, with a list of their
+        extents once rotated (see ShapeFlattener.flatten_shapes)
+        '''
+        if self.executor:
+            chunks = shape_chunks(self.iter_elements(), SHAPE_CHUNK_SIZE)
+            yield from map_in_order(self.executor, self.flattener.flatten_shapes, chunks, 2 * self.jobs)
+        else:
+            for elem, parent_mat in self.iter_elements():
+                polylines = self.svg_elem_to_polylines(elem, parent_mat)
+                yield polylines, [self.flattener.extents(points) for points in polylines]
 
-        shape_class = getattr(shapes, tag_suffix)
-        shape_obj = shape_class(elem)
-        path = shape_obj.d_path()
-        mtx = shape_obj.transformation_matrix()
-        if path:
-            points = shapes.point_generator(path, mtx, self.settings.smoothness)
-            for point in points:
-                elem_extents = elem_extents.expand_to(rotate(Vector2(point), self.rotate_rads))
+    def iter_measured(self):
+        '''
+        Yield lists of the exact extents of the shapes in the SVG file once rotated, without
+        flattening them (see ShapeFlattener.measure_shapes)
+        '''
+        if self.executor:
+            chunks = shape_chunks(self.iter_elements(), SHAPE_CHUNK_SIZE)
+            yield from map_in_order(self.executor, self.flattener.measure_shapes, chunks, 2 * self.jobs)
+        else:
+            for elem, parent_mat in self.iter_elements():
+                tag_suffix = elem.tag.split('}')[-1]
+                if tag_suffix in SVG_TAGS:
+                    extents = getattr(shapes, tag_suffix)(elem).extents(self.flattener.rotation_3x3, parent_mat)
+                    if extents is not None:
+                        yield [extents]
+
+    def iter_kept_extents(self):
+        '''
+        Yield lists of the extents of the flattened shapes in the SVG file once rotated, as
+        iter_flattened does, keeping the shapes in self.polylines for convert()
+        '''
+        for polylines, extents in self.iter_flattened():
+            for points in polylines:
+                self.keep_polyline(points)
+            yield extents
 
-        return elem_extents
+    def keep_polyline(self, points):
+        '''Keep a flattened shape in self.polylines, counting its points'''
+        self.polylines.append(points, len(points))
+        self.point_count += len(points)
 
     def get_svg_bounding_box(self):
         '''
-        Return a Rect describing the bounding box of coords in the SVG file. 
-        [TODO: is this already a function in the SVG lib?]
+        Return a Rect describing the bounding box of the shapes in the SVG file. In the
+        'flattened' bbox mode, every shape is flattened into self.polylines and measured by its
+        points; in the 'analytic' mode the shapes are measured from their curves.
         '''
-        svg_bounding_box = Rect.far_extents()
-        for elem in self.svg_root.iter():
-            elem_extents = self._get_elem_extents(elem)
-            svg_bounding_box = svg_bounding_box.expand_to(elem_extents)
+        # a running min and max, so that nothing is kept per shape in the 'analytic' mode
+        low = np.full(2, np.inf)
+        high = np.full(2, -np.inf)
+        if self.bbox_mode == bbox.ANALYTIC:
+            measured = self.iter_measured()
+        else:
+            measured = self.iter_kept_extents()
+        for extents in measured:
+            if extents:
+                corners = np.array(extents)
+                low = np.minimum(low, corners[:, 0].min(axis=0))
+                high = np.maximum(high, corners[:, 1].max(axis=0))
+
+        svg_bounding_box = Rect(Vec2.of(low), Vec2.of(high))
 
         print(f'SVG extents: {svg_bounding_box}')
         return svg_bounding_box
@@ -233,12 +637,104 @@ class SVG2GCodeConverter():
 
         return scale, offset
 
+    def iter_gcode(self):
+        '''
+        Yield the G-code for the shapes in the SVG file, in the order of iter_polylines(), or in
+        the 'analytic' bbox mode with worker processes, flattened and formatted together in
+        document order unless overlaps are to be removed
+        '''
+        if self.bbox_mode == bbox.ANALYTIC and self.executor and not self.overlap_tolerance_mm:
+            chunks = shape_chunks(self.iter_elements(), SHAPE_CHUNK_SIZE)
+            func = functools.partial(flatten_and_format, self.flattener, self.formatter)
+            for gcode, point_count, plotted_count in map_in_order(self.executor, func, chunks, 2 * self.jobs):
+                self.point_count += point_count
+                self.formatted_count += point_count
+                self.plotted_count += plotted_count
+                yield gcode
+        else:
+            chunks = self.count_formatted(polyline_chunks(self.iter_polylines(), POLYLINE_CHUNK_SIZE))
+            if self.executor:
+                formatted = map_in_order(self.executor, self.formatter.format_shapes, chunks, 2 * self.jobs)
+            else:
+                formatted = map(self.formatter.format_shapes, chunks)
+            for gcode, plotted_count in formatted:
+                self.plotted_count += plotted_count
+                yield gcode
+
+    def count_formatted(self, chunks):
+        '''Yield chunks of flattened shapes, counting the points in them as they go to be formatted'''
+        for chunk in chunks:
+            self.formatted_count += sum(len(points) for points in chunk)
+            yield chunk
+
+    def iter_polylines(self):
+        '''
+        Return an iterator over the flattened shapes to plot, in plotting order: the shapes kept
+        by get_svg_bounding_box(), or in the 'analytic' bbox mode, the shapes flattened as they
+        go in document order, less any overlaps if overlap_tolerance_mm is set
+        '''
+        if self.bbox_mode == bbox.ANALYTIC:
+            polylines = self.iter_flattened_polylines()
+        else:
+            polylines = iter(self.polylines)
+        if self.overlap_tolerance_mm:
+            polylines = self.remove_overlaps(polylines)
+        return polylines
+
+    def iter_flattened_polylines(self):
+        '''Yield the shapes in the SVG file flattened, in document order, counting their points'''
+        if self.executor:
+            for polylines, _ in self.iter_flattened():
+                for points in polylines:
+                    self.point_count += len(points)
+                    yield points
+        else:
+            for elem, parent_mat in self.iter_elements():
+                for points in self.svg_elem_to_polylines(elem, parent_mat):
+                    self.point_count += len(points)
+                    yield points
+
+    def remove_overlaps(self, polylines):
+        '''
+        Yield the parts of flattened shapes that don't retrace earlier shapes to within
+        overlap_tolerance_mm (see utils.OverlapRemover), splitting shapes around the overlaps
+        '''
+        # shapes are in SVG units, which the plot scales by the same amount in x and y
+        mm_per_unit = abs(self.scale.x)
+        width, height = (abs(size) for size in self.svg_bounding_box.size)
+        # in the 'flattened' bbox mode the points are already counted, so the segment grid
+        # can be sized for them up front; otherwise it grows as they stream past
+        self.overlap_remover = OverlapRemover(
+            self.overlap_tolerance_mm / mm_per_unit, max(width, height), MIN_OVERLAP_MM / mm_per_unit,
+            self.point_count,
+        )
+        for points in polylines:
+            yield from self.overlap_remover.remove_overlaps(points)
+
     def convert(self):
         ''' The main method that converts svg files into gcode files.'''
-        # Iterate through svg elements
-        for elem in self.svg_root.iter():
-            self.svg_elem_to_gcode(elem)
+        try:
+            for gcode in self.iter_gcode():
+                self.gcode_file.write(gcode)
+        finally:
+            if self.executor:
+                self.executor.shutdown()
+        self.polylines.close()
         self.gcode_file.close()
+        if self.overlap_remover is not None:
+            print(f'Overlaps removed: {self.overlap_remover.saved * abs(self.scale.x):.1f}mm of pen-down travel')
+        if (self.simplify_tolerance_mm or self.arc_tolerance_mm) and self.formatted_count:
+            print(f'Moves: {self.formatted_count} points plotted in {self.plotted_count} moves ({100 * (1 - self.plotted_count / self.formatted_count):.1f}% fewer)')
+
+    def abort(self):
+        '''
+        Stop a conversion that has failed: shut down any worker processes, discard the kept
+        shapes, and close the gcode file as it is, without its postamble
+        '''
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+        self.polylines.close()
+        self.gcode_file.abort()
 
     def debug_log(self, message):
         ''' Simple debugging function. If you don't understand
@@ -252,10 +748,14 @@ if __name__ == '__main__':
     _settings = importlib.import_module(args.settings)
     kwargs = vars(args)
     kwargs['settings'] = _settings
-    outdir, input_filename = os.path.split(kwargs['svg_path'])
-    gcode_path = os.path.join(outdir, input_filename.split('.svg')[0] + '.gcode')
+    gcode_path = gcode_path_for(kwargs['svg_path'])
     print('Output File: ' + gcode_path)
     kwargs['gcode_path'] = gcode_path
 
     gcode_converter = SVG2GCodeConverter(**kwargs)
-    gcode_converter.convert()
\ No newline at end of file
+    try:
+        gcode_converter.convert()
+    except PointOutOfRangeError as error:
+        print(f'\t--POINT OUT OF RANGE: {error.point}')
+        import ipdb as pdb; pdb.set_trace()
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,109 @@
+from math import hypot
+
+import numpy as np
+
+from svg2gcode import format_arc_moves
+from utils import fit_arcs
+from utils.arcs import MIN_ARC_POINTS
+
+MAX_RADIUS = 1000.0
+
+
+def ellipse_points(rx, ry, count, sweep=2 * np.pi):
+    '''Return count points evenly round an ellipse centred on 10, 20, from angle 0 to sweep'''
+    angles = np.linspace(0, sweep, count)
+    return np.column_stack((10 + rx * np.cos(angles), 20 + ry * np.sin(angles)))
+
+
+def covers(runs, n):
+    '''Return whether runs go from the first to the last of n points, each from where the last ended'''
+    return runs[0][0] == 0 and runs[-1][1] == n - 1 and all(
+        run[1] == following[0] for run, following in zip(runs, runs[1:])
+    )
+
+
+def test_straight_line_is_one_line_run():
+    points = np.column_stack((np.linspace(0, 10, 20), np.linspace(0, 5, 20)))
+    assert fit_arcs(points, 0.01, MAX_RADIUS) == [(0, 19, None)]
+
+
+def test_zigzag_is_one_line_run():
+    points = np.array([[x, x % 2] for x in range(10)], dtype=float)
+    assert fit_arcs(points, 0.01, MAX_RADIUS) == [(0, 9, None)]
+
+
+def test_circle_is_one_full_arc():
+    points = ellipse_points(5, 5, 33)
+    runs = fit_arcs(points, 0.01, MAX_RADIUS, 0.1)
+    assert len(runs) == 1
+    start, end, (cx, cy, clockwise, full) = runs[0]
+    assert (start, end) == (0, 32)
+    assert full and not clockwise
+    assert np.allclose((cx, cy), (10, 20))
+
+
+def test_reversed_circle_is_clockwise():
+    points = ellipse_points(5, 5, 33)[::-1].copy()
+    (_, _, (_, _, clockwise, full)), = fit_arcs(points, 0.01, MAX_RADIUS, 0.1)
+    assert full and clockwise
+
+
+def test_circle_closed_within_tolerance_is_one_full_arc():
+    points = ellipse_points(5, 5, 33)
+    points[-1] += 0.005
+    (_, _, (_, _, _, full)), = fit_arcs(points, 0.01, MAX_RADIUS, 0.1)
+    assert full
+
+
+def test_circle_round_twice_is_not_one_arc():
+    points = ellipse_points(5, 5, 65, 4 * np.pi)
+    runs = fit_arcs(points, 0.01, MAX_RADIUS, 0.1)
+    assert covers(runs, 65)
+    assert not any(arc and arc[3] for _, _, arc in runs)
+
+
+def test_part_of_circle_is_one_arc():
+    points = ellipse_points(5, 5, 17, np.pi)
+    runs = fit_arcs(points, 0.01, MAX_RADIUS, 0.1)
+    assert len(runs) == 1
+    start, end, (cx, cy, clockwise, full) = runs[0]
+    assert (start, end) == (0, 16)
+    assert not full and not clockwise
+
+
+def test_ellipse_is_arcs_within_tolerance():
+    points = ellipse_points(40, 20, 200)
+    tolerance = 0.05
+    runs = fit_arcs(points, tolerance, MAX_RADIUS)
+    assert covers(runs, 200)
+    arcs = [run for run in runs if run[2] is not None]
+    assert arcs
+    for start, end, (cx, cy, _, full) in arcs:
+        assert not full
+        assert end - start >= MIN_ARC_POINTS - 1
+        distances = np.hypot(points[start:end + 1, 0] - cx, points[start:end + 1, 1] - cy)
+        radius = hypot(points[start, 0] - cx, points[start, 1] - cy)
+        assert np.abs(distances - radius).max() <= tolerance
+
+
+def test_radius_over_max_is_lines():
+    points = ellipse_points(2000, 2000, 33, 0.01)
+    assert fit_arcs(points, 0.01, MAX_RADIUS) == [(0, 32, None)]
+
+
+def test_zero_tolerance_is_lines():
+    points = ellipse_points(5, 5, 33)
+    assert fit_arcs(points, 0.0, MAX_RADIUS) == [(0, 32, None)]
+
+
+def test_too_few_points():
+    assert fit_arcs(np.zeros((1, 2)), 0.01, MAX_RADIUS) == []
+    assert fit_arcs(ellipse_points(5, 5, 3, 1.0), 0.01, MAX_RADIUS) == [(0, 2, None)]
+
+
+def test_full_circle_is_written_back_to_its_start():
+    points = ellipse_points(5, 5, 33)
+    points[-1] += 0.005
+    code, x, y, i, j = format_arc_moves(points, fit_arcs(points, 0.01, MAX_RADIUS, 0.1), 3).split()
+    assert (code, x, y) == ('G03', 'X15.000', 'Y20.000')
+    assert np.allclose((float(i[1:]), float(j[1:])), (-5, 0), atol=1e-3)
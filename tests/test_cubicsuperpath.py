@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from lib.cubicsuperpath import CompactSuperPath
+
+PATH = 'M 0 0 C 1 2 3 4 5 6 L 7 8 M 10 10 L 20 20 L 30 10 M 40 40 C 41 42 43 44 45 46'
+
+
+@pytest.fixture
+def paths():
+    csp = CompactSuperPath.parsePath(PATH)
+    return csp, csp.toList()
+
+
+def test_index_matches_list_form(paths):
+    csp, listed = paths
+    assert len(csp) == len(listed) == 3
+    for i in [0, 1, 2, -1, -3]:
+        assert csp[i].tolist() == listed[i]
+    with pytest.raises(IndexError):
+        csp[3]
+
+
+@pytest.mark.parametrize('key', [
+    slice(0, 1), slice(1, None), slice(None), slice(None, -1), slice(None, None, 2),
+    slice(None, None, -1), slice(2, 0, -1), slice(2, 1), slice(5, 9),
+])
+def test_slice_matches_list_form(paths, key):
+    csp, listed = paths
+    sliced = csp[key]
+    assert isinstance(sliced, CompactSuperPath)
+    assert sliced.toList() == listed[key]
+    assert sliced.offsets[-1] == len(sliced.nodes)
+
+
+def test_contiguous_slice_shares_nodes(paths):
+    csp, _ = paths
+    assert np.shares_memory(csp[1:].nodes, csp.nodes)
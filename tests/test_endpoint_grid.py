@@ -0,0 +1,55 @@
+import time
+from math import hypot
+
+import numpy as np
+
+from utils import EndpointGrid
+
+
+def random_points(count, low, high, seed=0):
+    rand = np.random.default_rng(seed)
+    return dict(enumerate(map(tuple, rand.uniform(low, high, (count, 2)).tolist())))
+
+
+def brute_nearest(points, location, k=1):
+    return sorted(points, key=lambda point_id: (hypot(points[point_id][0] - location[0], points[point_id][1] - location[1]), point_id))[:k]
+
+
+def test_nearest_matches_brute_force():
+    points = random_points(500, 0, 100)
+    grid = EndpointGrid(points)
+    for location in [(50, 50), (0, 0), (100, 100), (-20, 130), (3.5, 97.2)]:
+        assert grid.nearest(location) == brute_nearest(points, location)[0]
+
+
+def test_nearest_k_matches_brute_force():
+    points = random_points(500, 0, 100)
+    grid = EndpointGrid(points)
+    for location in [(50, 50), (-20, 130)]:
+        assert grid.nearest_k(location, 5) == brute_nearest(points, location, 5)
+
+
+def test_nearest_after_removals():
+    points = random_points(200, 0, 100)
+    grid = EndpointGrid(points)
+    for point_id in range(150):
+        grid.remove(point_id)
+        del points[point_id]
+    assert grid.nearest((50, 50)) == brute_nearest(points, (50, 50))[0]
+
+
+def test_nearest_from_far_outside_the_grid():
+    points = random_points(20000, 5000, 5100)
+    grid = EndpointGrid(points)
+    start = time.perf_counter()
+    assert grid.nearest((0, 0)) == brute_nearest(points, (0, 0))[0]
+    assert grid.nearest((10000, 5050)) == brute_nearest(points, (10000, 5050))[0]
+    assert grid.nearest_k((0, 0), 3) == brute_nearest(points, (0, 0), 3)
+    # the rings start at the edge of the grid, rather than crossing the empty cells to it
+    assert time.perf_counter() - start < 1.0
+
+
+def test_empty_grid():
+    grid = EndpointGrid({})
+    assert grid.nearest((0, 0)) is None
+    assert grid.nearest_k((0, 0), 3) == []
@@ -0,0 +1,95 @@
+import numpy as np
+
+from utils import OverlapRemover, SegmentGrid
+
+
+def arc_points(count, radius=50.0):
+    '''Return count points evenly along a quarter circle, a densely flattened curve'''
+    angles = np.linspace(0, np.pi / 2, count)
+    return np.column_stack((radius * np.cos(angles), radius * np.sin(angles)))
+
+
+def test_dense_curve_drawn_twice_is_removed():
+    curve = arc_points(500)
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    assert len(remover.remove_overlaps(curve)) == 1
+    # each segment is much shorter than min_run, but the retrace is the whole curve
+    assert remover.remove_overlaps(curve.copy()) == []
+    assert np.isclose(remover.saved, 50.0 * np.pi / 2, rtol=1e-3)
+
+
+def test_partial_overlap_is_split_out():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    remover.remove_overlaps(np.array([[0.0, 0.0], [10.0, 0.0]]))
+    pieces = remover.remove_overlaps(np.array([[5.0, 0.0], [15.0, 0.0]]))
+    assert len(pieces) == 1
+    np.testing.assert_allclose(pieces[0], [[10.0, 0.0], [15.0, 0.0]])
+    assert np.isclose(remover.saved, 5.0)
+
+
+def test_overlap_in_the_middle_splits_the_shape():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    remover.remove_overlaps(np.array([[4.0, 0.0], [6.0, 0.0]]))
+    pieces = remover.remove_overlaps(np.array([[0.0, 0.0], [10.0, 0.0]]))
+    assert len(pieces) == 2
+    np.testing.assert_allclose(pieces[0], [[0.0, 0.0], [4.0, 0.0]])
+    np.testing.assert_allclose(pieces[1], [[6.0, 0.0], [10.0, 0.0]])
+
+
+def test_reversed_retrace_is_removed():
+    curve = arc_points(50)
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    remover.remove_overlaps(curve)
+    assert remover.remove_overlaps(curve[::-1].copy()) == []
+
+
+def test_retrace_within_tolerance_is_removed():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    remover.remove_overlaps(np.array([[0.0, 0.0], [10.0, 0.0]]))
+    assert remover.remove_overlaps(np.array([[0.0, 0.03], [10.0, 0.03]])) == []
+
+
+def test_parallel_line_beyond_tolerance_is_kept():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    remover.remove_overlaps(np.array([[0.0, 0.0], [10.0, 0.0]]))
+    assert len(remover.remove_overlaps(np.array([[0.0, 0.1], [10.0, 0.1]]))) == 1
+    assert remover.saved == 0.0
+
+
+def test_overlaps_shorter_than_min_run_are_kept():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    remover.remove_overlaps(np.array([[0.0, 0.0], [10.0, 0.0]]))
+    pieces = remover.remove_overlaps(np.array([[9.5, 0.0], [20.0, 0.0]]))
+    assert len(pieces) == 1
+    np.testing.assert_allclose(pieces[0], [[9.5, 0.0], [20.0, 0.0]])
+    assert remover.saved == 0.0
+
+
+def test_min_run_is_at_least_twice_the_tolerance():
+    assert OverlapRemover(0.5, 100.0, min_run=0.1).min_run == 1.0
+
+
+def test_shape_turning_back_at_a_sharp_corner_is_kept():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    # back along itself for 0.5, then away
+    points = np.array([[0.0, 0.0], [10.0, 0.0], [9.5, 0.01], [9.5, 10.0]])
+    pieces = remover.remove_overlaps(points)
+    assert len(pieces) == 1
+    np.testing.assert_allclose(pieces[0], points)
+
+
+def test_grid_rebuilt_as_it_fills_still_finds_overlaps():
+    remover = OverlapRemover(0.05, 100.0, min_run=1.0)
+    first = np.array([[0.0, 0.0], [10.0, 0.0]])
+    remover.remove_overlaps(first)
+    cell_size = remover.grid.cell_size
+    # a hatching of 5000 segments, enough to rebuild the grid with smaller cells twice
+    for k in range(1, 5001):
+        remover.remove_overlaps(np.array([[20.0 + k * 0.1, 20.0], [20.0 + k * 0.1, 80.0]]))
+    assert remover.grid.cell_size < cell_size / 2
+    assert remover.remove_overlaps(first.copy()) == []
+    assert np.isclose(remover.saved, 10.0)
+
+
+def test_size_hint_sizes_the_grid_up_front():
+    assert SegmentGrid(100.0, 0.05, 10000).cell_size == SegmentGrid(100.0, 0.05).cell_size / 6.25
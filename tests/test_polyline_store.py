@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils import PolylineStore
+
+
+def polylines(count):
+    return [np.full((k % 5 + 2, 2), float(k)) for k in range(count)]
+
+
+@pytest.mark.parametrize('max_points', [5_000_000, 10])
+def test_records_iterate_in_order(max_points):
+    store = PolylineStore(max_points)
+    records = polylines(50)
+    for points in records:
+        store.append(points, len(points))
+    assert len(store) == 50
+    for points, stored in zip(records, store):
+        np.testing.assert_array_equal(points, stored)
+
+
+@pytest.mark.parametrize('max_points', [5_000_000, 10])
+def test_records_read_by_index_in_any_order(max_points):
+    store = PolylineStore(max_points)
+    records = polylines(50)
+    for points in records:
+        store.append(points, len(points))
+    for index in [49, 0, 17, 3, 17, -1, -50]:
+        np.testing.assert_array_equal(store[index], records[index])
+    with pytest.raises(IndexError):
+        store[50]
+
+
+def test_spills_past_max_points():
+    store = PolylineStore(10)
+    for points in polylines(50):
+        store.append(points, len(points))
+    assert store.spilled_records > 0
+    assert store.points_in_memory <= 10
+    # reading back doesn't get in the way of spilling more
+    store[5]
+    store.append(np.zeros((20, 2)), 20)
+    np.testing.assert_array_equal(store[50], np.zeros((20, 2)))
+    np.testing.assert_array_equal(store[49], polylines(50)[49])
+
+
+def test_close_discards_records():
+    store = PolylineStore(10)
+    for points in polylines(50):
+        store.append(points, len(points))
+    store.close()
+    assert len(store) == 0
+    assert list(store) == []
@@ -0,0 +1,63 @@
+import numpy as np
+
+from utils import simplify_polylines
+from utils.simplify import segment_distances
+
+
+def wavy_line(count):
+    '''Return count points along a line with a little noise across it'''
+    rand = np.random.default_rng(0)
+    x = np.linspace(0, 100, count)
+    return np.column_stack((x, np.sin(x / 7) + rand.normal(0, 0.02, count)))
+
+
+def distances_from_simplified(points, simplified):
+    '''Return the distance of each of points from the nearest segment of simplified'''
+    a = simplified[:-1]
+    b = simplified[1:]
+    return np.array([
+        segment_distances(np.repeat(point[None], len(a), axis=0), a, b).min() for point in points
+    ])
+
+
+def test_points_are_within_tolerance():
+    points = wavy_line(1000)
+    simplified, = simplify_polylines([points], 0.05)
+    assert len(simplified) < len(points)
+    assert distances_from_simplified(points, simplified).max() <= 0.05
+
+
+def test_simplified_points_are_a_subset_in_order():
+    points = wavy_line(200)
+    simplified, = simplify_polylines([points], 0.1)
+    index = [np.flatnonzero((points == point).all(axis=1))[0] for point in simplified]
+    assert index == sorted(index)
+
+
+def test_ends_are_kept():
+    polylines = [wavy_line(300), np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0]]), wavy_line(2)]
+    for points, simplified in zip(polylines, simplify_polylines(polylines, 10.0)):
+        np.testing.assert_array_equal(simplified[0], points[0])
+        np.testing.assert_array_equal(simplified[-1], points[-1])
+
+
+def test_straight_line_keeps_only_its_ends():
+    points = np.column_stack((np.linspace(0, 10, 50), np.zeros(50)))
+    simplified, = simplify_polylines([points], 0.01)
+    np.testing.assert_array_equal(simplified, points[[0, -1]])
+
+
+def test_closed_shape_keeps_its_corners():
+    square = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]])
+    simplified, = simplify_polylines([square], 0.01)
+    np.testing.assert_array_equal(simplified, square)
+
+
+def test_zero_tolerance_leaves_points_unchanged():
+    polylines = [wavy_line(100), np.array([[0.0, 0.0], [5.0, 5.0]]), np.array([[1.0, 1.0]])]
+    for points, simplified in zip(polylines, simplify_polylines(polylines, 0.0)):
+        np.testing.assert_array_equal(simplified, points)
+
+
+def test_no_polylines():
+    assert simplify_polylines([], 0.1) == []
@@ -1,5 +1,13 @@
 from .rect import Rect
-from vectormath import Vector2
+from .vec2 import Vec2
+from .polyline_store import PolylineStore
+from .endpoint_grid import EndpointGrid, grid_greedy_walk
+from .local_search import RouteImprover, improve_route
+from .path_chains import PointHash, chain_paths
+from .overlaps import OverlapRemover, SegmentGrid
+from .simplify import simplify_polylines
+from .arcs import fit_arcs
+import numpy as np
 from math import cos, sin
 
 
@@ -7,7 +15,25 @@ def rotate(vec, theta):
     '''rotate vector clockwise by theta radians'''
     sintheta = sin(theta)
     costheta = cos(theta)
-    return Vector2(
+    return Vec2(
         vec.x * costheta - vec.y * sintheta,
         vec.x * sintheta + vec.y * costheta,
-    )
\ No newline at end of file
+    )
+
+
+def affine_matrix(scale, theta, offset):
+    '''
+    Return the 2x3 matrix that rotates points clockwise by theta radians, then multiplies them
+    by scale and adds offset (each an x, y pair).
+    '''
+    sintheta = sin(theta)
+    costheta = cos(theta)
+    return np.array([
+        [scale[0] * costheta, -scale[0] * sintheta, offset[0]],
+        [scale[1] * sintheta, scale[1] * costheta, offset[1]],
+    ])
+
+
+def apply_affine(matrix, points):
+    '''Return an (n, 2) array of points transformed by a 2x3 affine matrix'''
+    return points @ matrix[:, :2].T + matrix[:, 2]
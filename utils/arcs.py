@@ -0,0 +1,195 @@
+from math import hypot, pi
+
+import numpy as np
+
+
+# An arc replaces a run of at least this many points, i.e. three or more line moves
+MIN_ARC_POINTS = 4
+
+
+def circle_centre(p0, p1, p2):
+    '''
+    Return the x, y of the centre of the circle through three points, or None if they are in
+    line. Given arrays of x and of y for each point, returns arrays, with inf where in line.
+    '''
+    ax, ay = p0
+    bx, by = p1
+    cx, cy = p2
+    d = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if not isinstance(d, np.ndarray) and d == 0:
+        return None
+    a2 = ax * ax + ay * ay
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    return (
+        (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d,
+        (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d,
+    )
+
+
+def angles_between(a, b):
+    '''Return the angles turned from each of an (n, 2) array of vectors to the next, in (-pi, pi]'''
+    cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    dot = a[:, 0] * b[:, 0] + a[:, 1] * b[:, 1]
+    return np.arctan2(cross, dot)
+
+
+def arc_fits(radius, distances, steps, tolerance, chord_tolerance, max_radius, min_turn=0.0, max_turn=2 * pi):
+    '''
+    Return whether the points at distances from a centre, and steps radians round it from one
+    to the next, lie within tolerance of a circle of radius, and the lines between them within
+    chord_tolerance, going one way round by more than min_turn and less than max_turn radians,
+    by default less than a turn. Works on arrays of arcs, in the last axis.
+    '''
+    abs_steps = np.abs(steps)
+    largest = abs_steps.max(axis=-1)
+    turned = abs_steps.sum(axis=-1)
+    # steps all the same way add up to the same total with or without their signs
+    one_way = np.abs(steps.sum(axis=-1)) == turned
+    # the lines between the points bow away from the arc by its sagitta over them
+    sagitta = radius * (1 - np.cos(largest / 2))
+    return (
+        (radius <= max_radius)
+        & (np.abs(distances - radius[..., None]).max(axis=-1) <= tolerance)
+        & one_way & (largest < pi / 2) & (turned > min_turn) & (turned < max_turn)
+        & (sagitta <= chord_tolerance)
+    )
+
+
+def short_arcs(points, tolerance, chord_tolerance, max_radius):
+    '''
+    Return for each point from which there are MIN_ARC_POINTS points, whether those points
+    fit an arc, as arc_through would find, all in one pass
+    '''
+    ends = len(points) - MIN_ARC_POINTS + 1
+    windows = np.stack([points[k:k + ends] for k in range(MIN_ARC_POINTS)], axis=1)
+    first = windows[:, 0]
+    middle = windows[:, (MIN_ARC_POINTS - 1) // 2]
+    last = windows[:, -1]
+    # points in line have their centre at infinity, and fit no arc
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centres = np.column_stack(circle_centre(first.T, middle.T, last.T))
+        offsets = windows - centres[:, None, :]
+        distances = np.hypot(offsets[..., 0], offsets[..., 1])
+        steps = np.column_stack([
+            angles_between(offsets[:, k], offsets[:, k + 1]) for k in range(MIN_ARC_POINTS - 1)
+        ])
+        return arc_fits(distances[:, 0], distances, steps, tolerance, chord_tolerance, max_radius)
+
+
+def arc_through(points, start, end, tolerance, chord_tolerance, max_radius):
+    '''
+    Return (centre x, centre y, clockwise, False) for an arc from points[start] to points[end] that
+    passes within tolerance of every point between, and within chord_tolerance of every line
+    between them, going round one way by less than a turn. Return None if there is no such arc.
+    '''
+    first, middle, last = points[[start, (start + end) // 2, end]].tolist()
+    centre = circle_centre(first, middle, last)
+    if centre is None:
+        return None
+    cx, cy = centre
+    radius = hypot(first[0] - cx, first[1] - cy)
+    offsets = points[start:end + 1] - centre
+    steps = angles_between(offsets[:-1], offsets[1:])
+    distances = np.hypot(offsets[:, 0], offsets[:, 1])
+    if not arc_fits(np.float64(radius), distances, steps, tolerance, chord_tolerance, max_radius):
+        return None
+    return cx, cy, bool(steps[0] < 0), False
+
+
+def full_circle(points, tolerance, chord_tolerance, max_radius):
+    '''
+    Return (centre x, centre y, clockwise, True) if points are a closed loop, ending within
+    tolerance of where they start, that goes once round a circle within tolerance of every
+    point and within chord_tolerance of every line between them. Return None if they aren't.
+    '''
+    n = len(points)
+    if n <= MIN_ARC_POINTS or hypot(*(points[-1] - points[0]).tolist()) > tolerance:
+        return None
+    centre = circle_centre(*points[[0, n // 3, 2 * n // 3]].tolist())
+    if centre is None:
+        return None
+    cx, cy = centre
+    offsets = points - centre
+    steps = angles_between(offsets[:-1], offsets[1:])
+    distances = np.hypot(offsets[:, 0], offsets[:, 1])
+    radius = distances[0]
+    # once round, give or take how far apart the ends are
+    slack = tolerance / radius if radius > tolerance else pi
+    if not arc_fits(radius, distances, steps, tolerance, chord_tolerance, max_radius,
+                    2 * pi - slack, 2 * pi + slack):
+        return None
+    return cx, cy, bool(steps[0] < 0), True
+
+
+def fit_arcs(points, tolerance, max_radius, chord_tolerance=None):
+    '''
+    Return the runs of an (n, 2) array of points to draw as lines and as circular arcs, as a
+    list of (start, end, arc) in order. arc is None for a run of line moves to each of
+    points[start + 1:end + 1], or (centre x, centre y, clockwise, full) for one arc move from
+    points[start] to points[end] that is within tolerance of the points it replaces.
+
+    A closed loop of points on one circle is one arc all the way round, with full true: it is
+    to be drawn back to points[start], which points[end] is only within tolerance of.
+
+    The arc must also be within chord_tolerance, by default tolerance, of the lines between
+    the points. Where the points are on a curve, and the lines only approximate it to within
+    some flattening tolerance, the arc may be as far again from them.
+
+    A tolerance of 0 fits no arcs, rather than those the points happen to round onto exactly.
+
+    Arcs are grown greedily from each point, doubling their length until they no longer fit and
+    then bisecting, so each takes only a few numpy passes over its points.
+    '''
+    if chord_tolerance is None:
+        chord_tolerance = tolerance
+    n = len(points)
+    if n < MIN_ARC_POINTS or tolerance <= 0:
+        return [(0, n - 1, None)] if n > 1 else []
+    circle = full_circle(points, tolerance, chord_tolerance, max_radius)
+    if circle is not None:
+        return [(0, n - 1, circle)]
+    # the starts of arcs are found together, and only grown one at a time
+    fits = short_arcs(points, tolerance, chord_tolerance, max_radius)
+    if not fits.any():
+        return [(0, n - 1, None)]
+    fits = fits.tolist()
+
+    runs = []
+    line_start = 0
+    start = 0
+    last_start = n - MIN_ARC_POINTS
+    while start <= last_start:
+        if not fits[start]:
+            start += 1
+            continue
+        end = start + MIN_ARC_POINTS - 1
+        arc = arc_through(points, start, end, tolerance, chord_tolerance, max_radius)
+        if arc is None:
+            # rounding can differ from short_arcs right at the tolerance
+            start += 1
+            continue
+        # the longest run found to fit, and the shortest found not to
+        good = end
+        bad = None
+        while good < n - 1:
+            end = min(start + 2 * (good - start), n - 1)
+            longer = arc_through(points, start, end, tolerance, chord_tolerance, max_radius)
+            if longer is None:
+                bad = end
+                break
+            good, arc = end, longer
+        while bad is not None and bad - good > 1:
+            end = (good + bad) // 2
+            longer = arc_through(points, start, end, tolerance, chord_tolerance, max_radius)
+            if longer is None:
+                bad = end
+            else:
+                good, arc = end, longer
+        if line_start < start:
+            runs.append((line_start, start, None))
+        runs.append((start, good, arc))
+        start = line_start = good
+    if line_start < n - 1:
+        runs.append((line_start, n - 1, None))
+    return runs
@@ -0,0 +1,151 @@
+import heapq
+from math import floor, hypot, sqrt
+
+
+class EndpointGrid():
+    '''
+    A uniform grid of points, each with an integer id, for finding the nearest point to a
+    location and then removing it.
+
+    Cells are about the size that would hold one point each if the points were spread evenly.
+    The nearest point is found by searching rings of cells outwards from the location until no
+    unsearched cell can hold anything closer. As points are removed the grid is rebuilt with
+    larger cells whenever it holds less than a quarter of the points it was built with, so that
+    searches don't slow down crossing empty cells; the rebuilds cost O(1) amortised per removal.
+    '''
+    def __init__(self, points):
+        '''Index an iterable of (id, (x, y)) pairs, or a dict of them'''
+        self.points = dict(points)
+        self.build()
+
+    def build(self):
+        '''Put every point into a grid sized for the number of points left'''
+        self.built_size = len(self.points)
+        if not self.points:
+            self.cells = {}
+            return
+        xs = [x for x, y in self.points.values()]
+        ys = [y for x, y in self.points.values()]
+        self.x0 = min(xs)
+        self.y0 = min(ys)
+        width = max(xs) - self.x0
+        height = max(ys) - self.y0
+        # points along a line would all be in one cell if only the area were considered
+        self.cell_size = max(sqrt(width * height / len(self.points)), max(width, height) / len(self.points)) or 1.0
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+        self.cells = {}
+        for point_id, point in self.points.items():
+            self.cells.setdefault(self.cell(point), set()).add(point_id)
+
+    def cell(self, point):
+        return (floor((point[0] - self.x0) / self.cell_size), floor((point[1] - self.y0) / self.cell_size))
+
+    def __len__(self):
+        return len(self.points)
+
+    def remove(self, point_id):
+        '''Remove a point from the grid'''
+        cell = self.cell(self.points.pop(point_id))
+        ids = self.cells[cell]
+        ids.discard(point_id)
+        if not ids:
+            del self.cells[cell]
+        if len(self.points) < self.built_size // 4:
+            self.build()
+
+    def ring(self, ci, cj, r):
+        '''
+        Yield the cells of the grid at a chessboard distance of r from the cell ci, cj, leaving
+        out those beyond its edges, which are empty
+        '''
+        if r == 0:
+            if 0 <= ci < self.columns and 0 <= cj < self.rows:
+                yield ci, cj
+            return
+        i0 = max(ci - r, 0)
+        i1 = min(ci + r, self.columns - 1)
+        for j in (cj - r, cj + r):
+            if 0 <= j < self.rows:
+                for i in range(i0, i1 + 1):
+                    yield i, j
+        j0 = max(cj - r + 1, 0)
+        j1 = min(cj + r - 1, self.rows - 1)
+        for i in (ci - r, ci + r):
+            if 0 <= i < self.columns:
+                for j in range(j0, j1 + 1):
+                    yield i, j
+
+    def first_ring(self, ci, cj):
+        '''Return the chessboard distance from the cell ci, cj to the nearest cell of the grid'''
+        return max(-ci, ci - self.columns + 1, -cj, cj - self.rows + 1, 0)
+
+    def nearest(self, location):
+        '''Return the id of the nearest point to location, or None if the grid is empty'''
+        if not self.points:
+            return None
+        x, y = location
+        ci, cj = self.cell(location)
+        # the location may be outside the grid, so the rings start at its edge and must reach
+        # across it from there
+        reach = max(ci, self.columns - ci, cj, self.rows - cj)
+        best_id = None
+        best_dist = float('inf')
+        for r in range(self.first_ring(ci, cj), reach + 1):
+            for cell in self.ring(ci, cj, r):
+                for point_id in self.cells.get(cell, ()):
+                    px, py = self.points[point_id]
+                    dist = hypot(px - x, py - y)
+                    if dist < best_dist or (dist == best_dist and point_id < best_id):
+                        best_id = point_id
+                        best_dist = dist
+            # anything in rings further out is at least r cells away
+            if best_dist <= r * self.cell_size:
+                break
+        return best_id
+
+    def nearest_k(self, location, k, exclude=()):
+        '''
+        Return the ids of the k nearest points to location, nearest first, leaving out those in
+        exclude. Fewer are returned if the grid doesn't hold enough.
+        '''
+        if not self.points:
+            return []
+        x, y = location
+        ci, cj = self.cell(location)
+        reach = max(ci, self.columns - ci, cj, self.rows - cj)
+        # a heap of the k nearest so far, furthest first
+        nearest = []
+        for r in range(self.first_ring(ci, cj), reach + 1):
+            for cell in self.ring(ci, cj, r):
+                for point_id in self.cells.get(cell, ()):
+                    if point_id in exclude:
+                        continue
+                    px, py = self.points[point_id]
+                    item = (-hypot(px - x, py - y), -point_id)
+                    if len(nearest) < k:
+                        heapq.heappush(nearest, item)
+                    elif item > nearest[0]:
+                        heapq.heapreplace(nearest, item)
+            if len(nearest) == k and -nearest[0][0] <= r * self.cell_size:
+                break
+        return [-point_id for dist, point_id in sorted(nearest, reverse=True)]
+
+
+def grid_greedy_walk(path_graph):
+    '''
+    Yield the nodes of a penkit_optimize PathGraph in the order of a greedy walk, as
+    penkit_optimize.greedy.greedy_walk does: from the origin, repeatedly draw the path with the
+    nearest end to the pen, in whichever direction starts there. Path ends are indexed in an
+    EndpointGrid rather than an R-tree.
+    '''
+    grid = EndpointGrid(path_graph.iter_starts_with_index())
+    location = path_graph.get_coordinates(path_graph.ORIGIN)
+    while True:
+        node = grid.nearest(location)
+        if node is None:
+            break
+        location = path_graph.get_coordinates(node, True)
+        grid.remove(node)
+        grid.remove(path_graph.get_disjoint(node))
+        yield node
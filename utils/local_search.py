@@ -0,0 +1,242 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from .endpoint_grid import EndpointGrid
+
+# Number of nearby path ends considered for new pen-up moves from each path end
+NEIGHBOURS = 8
+
+# Longest run of consecutive paths that an Or-opt move relocates
+MAX_SEGMENT = 3
+
+# How many paths are examined between checks of the time limit
+CHECK_EVERY = 64
+
+# Moves must shorten the route by more than this, so that rounding errors can't cause cycles
+TOLERANCE = 1e-9
+
+
+class RouteImprover():
+    '''
+    Shortens the pen-up travel of a route through a penkit_optimize PathGraph by local search,
+    for as long as it keeps finding improvements or until a time limit.
+
+    A route is a list of graph nodes, each a path drawn in one direction. Two kinds of move are
+    tried around each path, against the few path ends nearest to its own ends:
+
+    * 2-opt: reverse a run of paths, both their order and the direction each is drawn in,
+      which replaces the pen-up moves at either end of the run and leaves those inside it the
+      same length.
+    * Or-opt: move a run of up to MAX_SEGMENT paths elsewhere in the route, in either direction.
+
+    The first improving move found is made, and the paths whose pen-up moves it changed are
+    queued to be looked at again.
+    '''
+    def __init__(self, path_graph, neighbours=NEIGHBOURS):
+        self.graph = path_graph
+        # the start and end of every node as complex numbers, as in the PathGraph
+        self.starts = [start for start, end in path_graph.endpoints]
+        self.ends = [end for start, end in path_graph.endpoints]
+        grid = EndpointGrid(path_graph.iter_starts_with_index())
+        self.neighbours = [[]]
+        for node, coordinate in path_graph.iter_starts_with_index():
+            exclude = (node, path_graph.get_disjoint(node))
+            self.neighbours.append(grid.nearest_k(coordinate, neighbours, exclude))
+
+    def improve(self, solution, time_limit):
+        '''
+        Return an improved copy of solution, a list of nodes, after searching for up to
+        time_limit seconds. Interrupting the search with Ctrl-C returns the best route so far.
+        '''
+        deadline = time.perf_counter() + time_limit
+        # the route starts and ends at the origin, so that every path has a move before and after
+        self.order = [self.graph.ORIGIN] + list(solution) + [self.graph.ORIGIN]
+        # the position in the route of each path
+        self.position = np.zeros(len(solution), dtype=np.int64)
+        self.update_positions(1, len(self.order) - 1)
+        queue = deque(self.path(node) for node in solution)
+        queued = set(queue)
+        examined = 0
+        try:
+            while queue:
+                path = queue.popleft()
+                queued.discard(path)
+                changed = self.improve_path(path)
+                for changed_path in changed:
+                    if changed_path not in queued:
+                        queued.add(changed_path)
+                        queue.append(changed_path)
+                examined += 1
+                if examined % CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                    break
+        except KeyboardInterrupt:
+            # moves are made with a single slice assignment to self.order, so it is always a
+            # whole route
+            print('Local search interrupted, keeping the best route so far')
+        return self.order[1:-1]
+
+    def path(self, node):
+        return (node - 1) // 2
+
+    def S(self, i):
+        '''Return where the path at position i in the route starts'''
+        return self.starts[self.order[i]]
+
+    def E(self, i):
+        '''Return where the path at position i in the route ends'''
+        return self.ends[self.order[i]]
+
+    def locate(self, node):
+        '''
+        Return the position in the route of the path of a node, and whether the node's start is
+        that path's end as it is currently drawn
+        '''
+        i = int(self.position[self.path(node)])
+        return i, self.order[i] != node
+
+    def improve_path(self, path):
+        '''
+        Make the first improving move found around a path, returning the paths next to the
+        pen-up moves it changed, or an empty list if there was none
+        '''
+        i = int(self.position[path])
+        for move in (self.two_opt, self.or_opt):
+            changed = move(i)
+            if changed:
+                return changed
+        return []
+
+    def two_opt(self, i):
+        '''Try reversing a run of paths that starts or ends with the path at position i'''
+        node = self.order[i]
+        disjoint = self.graph.get_disjoint
+        # a new pen-up move from the end of this path to the end of a nearby path ...
+        current = abs(self.E(i) - self.S(i + 1))
+        for other in self.neighbours[disjoint(node)]:
+            if abs(self.ends[node] - self.starts[other]) >= current:
+                break
+            j, is_end = self.locate(other)
+            if is_end:
+                changed = self.reverse(min(i, j), max(i, j))
+                if changed:
+                    return changed
+        # ... or from the start of this path to the start of a nearby path
+        current = abs(self.E(i - 1) - self.S(i))
+        for other in self.neighbours[node]:
+            if abs(self.starts[node] - self.starts[other]) >= current:
+                break
+            j, is_end = self.locate(other)
+            if not is_end:
+                changed = self.reverse(min(i, j) - 1, max(i, j) - 1)
+                if changed:
+                    return changed
+        return []
+
+    def reverse(self, a, b):
+        '''
+        Reverse the paths at positions a + 1 to b if it shortens the route, joining the end of
+        path a to the end of path b, and the start of path a + 1 to the start of path b + 1.
+        Return the paths whose pen-up moves changed, or an empty list.
+        '''
+        if a >= b:
+            return []
+        delta = (
+            abs(self.E(a) - self.E(b)) + abs(self.S(a + 1) - self.S(b + 1))
+            - abs(self.E(a) - self.S(a + 1)) - abs(self.E(b) - self.S(b + 1))
+        )
+        if delta >= -TOLERANCE:
+            return []
+        changed = self.paths_at(a, a + 1, b, b + 1)
+        self.order[a + 1:b + 1] = backwards(self.order[a + 1:b + 1])
+        self.update_positions(a + 1, b + 1)
+        return changed
+
+    def or_opt(self, i):
+        '''Try moving a run of paths starting at position i to just after another path'''
+        order = self.order
+        starts = self.starts
+        ends = self.ends
+        n = len(order) - 2
+        disjoint = self.graph.get_disjoint
+        # after k, ending at the run's start, or before k, starting at the run's start reversed
+        start_targets = []
+        for other in self.neighbours[order[i]]:
+            k, is_end = self.locate(other)
+            start_targets.append((k, False) if is_end else (k - 1, True))
+        run_start = starts[order[i]]
+        before = ends[order[i - 1]]
+        for j in range(i, min(i + MAX_SEGMENT, n + 1)):
+            run_end = ends[order[j]]
+            after = starts[order[j + 1]]
+            # what taking the run out of the route saves
+            saved = abs(before - run_start) + abs(run_end - after) - abs(before - after)
+            # before k, starting at the run's end, or after k, ending at the run's end reversed
+            targets = list(start_targets)
+            for other in self.neighbours[disjoint(order[j])]:
+                k, is_end = self.locate(other)
+                targets.append((k, True) if is_end else (k - 1, False))
+            for t, reverse in targets:
+                if i - 1 <= t <= j:
+                    continue
+                # what putting it back in after t costs
+                end_t = ends[order[t]]
+                start_t = starts[order[t + 1]]
+                if reverse:
+                    cost = abs(end_t - run_end) + abs(run_start - start_t)
+                else:
+                    cost = abs(end_t - run_start) + abs(run_end - start_t)
+                if cost - abs(end_t - start_t) < saved - TOLERANCE:
+                    return self.move(i, j, t, reverse)
+        return []
+
+    def move(self, i, j, t, reverse):
+        '''
+        Move the paths at positions i to j to after position t, in the reverse direction if
+        reverse is true. Return the paths whose pen-up moves changed.
+        '''
+        changed = self.paths_at(i - 1, i, j, j + 1, t, t + 1)
+        run = self.order[i:j + 1]
+        if reverse:
+            run = backwards(run)
+        if t > j:
+            self.order[i:t + 1] = self.order[j + 1:t + 1] + run
+            self.update_positions(i, t + 1)
+        else:
+            self.order[t + 1:j + 1] = run + self.order[t + 1:i]
+            self.update_positions(t + 1, j + 1)
+        return changed
+
+    def update_positions(self, start, stop):
+        '''Record the positions of the paths at positions start to stop - 1 in the route'''
+        nodes = np.array(self.order[start:stop], dtype=np.int64)
+        self.position[(nodes - 1) // 2] = np.arange(start, stop)
+
+    def paths_at(self, *positions):
+        '''Return the paths at positions in the route, leaving out the origin'''
+        return [self.path(self.order[i]) for i in positions if self.order[i] != self.graph.ORIGIN]
+
+
+def backwards(nodes):
+    '''
+    Return a list of PathGraph nodes, other than the origin, in reverse order and each drawn in
+    the opposite direction (see PathGraph.get_disjoint)
+    '''
+    nodes = np.array(nodes, dtype=np.int64)[::-1]
+    return (((nodes - 1) ^ 1) + 1).tolist()
+
+
+def improve_route(solution, path_graph, time_limit):
+    '''
+    Return a copy of solution, a list of nodes of a PathGraph, with shorter pen-up travel found
+    by local search (see RouteImprover) in up to time_limit seconds, including the time taken
+    to find each path end's neighbours
+    '''
+    deadline = time.perf_counter() + time_limit
+    try:
+        improver = RouteImprover(path_graph)
+    except KeyboardInterrupt:
+        print('Local search interrupted, keeping the greedy route')
+        return list(solution)
+    return improver.improve(solution, deadline - time.perf_counter())
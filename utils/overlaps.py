@@ -0,0 +1,232 @@
+from math import atan2, ceil, floor, hypot, pi, sqrt
+
+import numpy as np
+
+
+# Directions of segments are put in this many buckets over a half turn. Only segments in the
+# same or neighbouring buckets are compared, so segments are only counted as overlapping if
+# they are within about 2 * pi / DIRECTIONS of parallel.
+DIRECTIONS = 64
+
+
+# A SegmentGrid is sized for at least this many segments, and rebuilt with smaller cells each
+# time it holds four times as many as it was sized for
+MIN_GRID_SEGMENTS = 256
+
+
+class SegmentGrid():
+    '''
+    Line segments in a uniform grid of square cells, and by direction, so that the segments
+    near and nearly parallel to a segment can be found without looking at every segment in
+    the cells it passes through, which for long hatching could be many. Each segment is put in
+    the cells within margin of it, so that near() need only look in the cells along a segment.
+
+    Cells are sized to hold about 16 segments each, if the segments were spread evenly over a
+    square of side extent. The number of segments needn't be known up front: the grid is
+    rebuilt with smaller cells as it fills, which costs O(1) amortised per segment added, and
+    size_hint, if given, saves the rebuilds up to that many.
+    '''
+    def __init__(self, extent, margin, size_hint=0):
+        self.extent = extent
+        self.margin = margin
+        self.segments = []
+        self.build(size_hint)
+
+    def build(self, size):
+        '''Put every segment into cells sized for size segments'''
+        self.built_size = max(size, MIN_GRID_SEGMENTS)
+        # cells narrower than twice the margin would be skipped over by cells_along
+        self.cell_size = max(4 * self.extent / sqrt(self.built_size), 2 * self.margin) or 1.0
+        self.cells = {}
+        for segment_id, segment in enumerate(self.segments):
+            self.bucket(segment_id, *segment)
+
+    def cells_along(self, x0, y0, x1, y1, margin=0.0):
+        '''
+        Return the set of cells within margin of points every half a cell along the segment
+        from x0, y0 to x1, y1. With a margin of 0, that is the cells that the segment passes
+        through, missing at most the corners of cells.
+        '''
+        size = self.cell_size
+        steps = int(ceil(2 * hypot(x1 - x0, y1 - y0) / size)) + 1
+        dx = (x1 - x0) / steps
+        dy = (y1 - y0) / steps
+        cells = set()
+        for i in range(steps + 1):
+            x = x0 + i * dx
+            y = y0 + i * dy
+            left = floor((x - margin) / size)
+            right = floor((x + margin) / size)
+            bottom = floor((y - margin) / size)
+            top = floor((y + margin) / size)
+            cells.add((left, bottom))
+            if left != right or bottom != top:
+                cells.update(((left, top), (right, bottom), (right, top)))
+        return cells
+
+    def direction(self, x0, y0, x1, y1):
+        '''Return the direction bucket of a segment, the same whichever way it is drawn'''
+        return int(atan2(y1 - y0, x1 - x0) % pi / pi * DIRECTIONS) % DIRECTIONS
+
+    def bucket(self, segment_id, x0, y0, x1, y1):
+        '''Put a segment in the cells within margin of it, by its direction'''
+        direction = self.direction(x0, y0, x1, y1)
+        for ci, cj in self.cells_along(x0, y0, x1, y1, self.margin):
+            self.cells.setdefault((ci, cj, direction), []).append(segment_id)
+
+    def add(self, x0, y0, x1, y1):
+        self.segments.append((x0, y0, x1, y1))
+        if len(self.segments) >= 4 * self.built_size:
+            self.build(len(self.segments))
+        else:
+            self.bucket(len(self.segments) - 1, x0, y0, x1, y1)
+
+    def near(self, x0, y0, x1, y1):
+        '''
+        Return the ids of the segments that may be within margin of a segment and are nearly
+        parallel to it
+        '''
+        direction = self.direction(x0, y0, x1, y1)
+        directions = ((direction - 1) % DIRECTIONS, direction, (direction + 1) % DIRECTIONS)
+        ids = set()
+        for ci, cj in self.cells_along(x0, y0, x1, y1):
+            for d in directions:
+                ids.update(self.cells.get((ci, cj, d), ()))
+        return ids
+
+
+def covered_intervals(px, py, ux, uy, length, segments, tolerance):
+    '''
+    Return the sorted, merged intervals of distance along the segment from p in the direction
+    of the unit vector u, for length, that lie within tolerance of any of segments
+    '''
+    intervals = []
+    for ax, ay, bx, by in segments:
+        # distances of a and b along the segment and across it
+        ta = (ax - px) * ux + (ay - py) * uy
+        tb = (bx - px) * ux + (by - py) * uy
+        da = (ay - py) * ux - (ax - px) * uy
+        db = (by - py) * ux - (bx - px) * uy
+        # the part of a -> b within tolerance of the line through the segment
+        if da == db:
+            if abs(da) > tolerance:
+                continue
+            lo, hi = 0.0, 1.0
+        else:
+            s1 = (-tolerance - da) / (db - da)
+            s2 = (tolerance - da) / (db - da)
+            lo = max(0.0, min(s1, s2))
+            hi = min(1.0, max(s1, s2))
+            if lo > hi:
+                continue
+        t0 = ta + lo * (tb - ta)
+        t1 = ta + hi * (tb - ta)
+        start = max(0.0, min(t0, t1))
+        end = min(length, max(t0, t1))
+        if start < end:
+            intervals.append((start, end))
+
+    merged = []
+    for start, end in sorted(intervals):
+        # gaps no wider than the tolerance are counted as covered
+        if merged and start <= merged[-1][1] + tolerance:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class OverlapRemover():
+    '''
+    Removes the parts of flattened shapes that retrace lines already drawn by earlier shapes,
+    or earlier in the same shape, to within a tolerance: exact duplicates, and lines that
+    overlap along part of their length.
+
+    Each segment of each shape is checked against the nearly parallel segments before it,
+    found in a SegmentGrid. Runs of the shape that lie within tolerance of them, over one
+    segment or many, are dropped if they are longer than min_run, and the shape is split into
+    separate shapes around them.
+    min_run is at least twice the tolerance, which leaves alone the short overlaps where a
+    shape turns back on itself at a sharp corner; a longer one avoids lifting the pen around
+    overlaps that are quicker to draw again.
+    extent is the width or height of the drawing, whichever is larger, and size_hint the
+    number of segments expected, if known (see SegmentGrid).
+    `saved` is the total length of the runs dropped.
+    '''
+    def __init__(self, tolerance, extent, min_run=0.0, size_hint=0):
+        self.tolerance = tolerance
+        self.min_run = max(min_run, 2 * tolerance)
+        self.grid = SegmentGrid(extent, tolerance, size_hint)
+        self.saved = 0.0
+
+    def remove_overlaps(self, points):
+        '''Return a list of arrays of points for the parts of a shape that aren't overlapped'''
+        if len(points) < 2:
+            return [points]
+        points = points.tolist()
+
+        # each segment, and the runs of the shape within tolerance of earlier segments, in
+        # distance along the shape, so that runs over many short segments are measured whole
+        segments = []
+        covered = []
+        distance = 0.0
+        for (px, py), (qx, qy) in zip(points, points[1:]):
+            length = hypot(qx - px, qy - py)
+            if length == 0:
+                continue
+            ux = (qx - px) / length
+            uy = (qy - py) / length
+            near = [self.grid.segments[i] for i in self.grid.near(px, py, qx, qy)]
+            if near:
+                for run_start, run_end in covered_intervals(px, py, ux, uy, length, near, self.tolerance):
+                    # runs that meet across the ends of segments, or nearly, are one run
+                    if covered and distance + run_start <= covered[-1][1] + self.tolerance:
+                        covered[-1][1] = max(covered[-1][1], distance + run_end)
+                    else:
+                        covered.append([distance + run_start, distance + run_end])
+            self.grid.add(px, py, qx, qy)
+            segments.append((px, py, ux, uy, distance, length, distance + length))
+            distance += length
+        # as are gaps no wider than the tolerance, the ends of the shape near covered runs
+        if covered and covered[0][0] <= self.tolerance:
+            covered[0][0] = 0.0
+        if covered and covered[-1][1] >= distance - self.tolerance:
+            covered[-1][1] = distance
+
+        dropped = [(start, end) for start, end in covered if end - start > self.min_run]
+        self.saved += sum(end - start for start, end in dropped)
+
+        pieces = []
+        piece = []
+        k = 0
+        for px, py, ux, uy, offset, length, end in segments:
+            # the runs of this segment to draw, between the dropped ones
+            drawn = []
+            start = 0.0
+            while k < len(dropped) and dropped[k][0] < end:
+                run_start, run_end = dropped[k]
+                drawn.append((start, run_start - offset))
+                if run_end > end:
+                    # the dropped run goes on into the next segment
+                    start = length
+                    break
+                start = length if run_end == end else run_end - offset
+                k += 1
+            drawn.append((start, length))
+
+            for run_start, run_end in drawn:
+                if run_end <= run_start:
+                    continue
+                if run_start > 0 or not piece:
+                    if len(piece) > 1:
+                        pieces.append(piece)
+                    piece = [[px + ux * run_start, py + uy * run_start]]
+                piece.append([px + ux * run_end, py + uy * run_end])
+            if start >= length:
+                # the segment ends in a dropped run, so the next one starts a new piece
+                if len(piece) > 1:
+                    pieces.append(piece)
+                piece = []
+        if len(piece) > 1:
+            pieces.append(piece)
+        return [np.array(piece) for piece in pieces]
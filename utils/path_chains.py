@@ -0,0 +1,97 @@
+from collections import deque
+from math import floor, hypot
+
+
+class PointHash():
+    '''
+    A spatial hash of points, each with an integer id, in square cells the size of a search
+    radius, so that the points within the radius of any location are in the 3x3 cells around it.
+    '''
+    def __init__(self, radius):
+        self.radius = radius
+        # nothing is within a radius of 0, but the cells still need a size
+        self.cell_size = radius or 1.0
+        self.cells = {}
+        self.points = {}
+
+    def cell(self, point):
+        return (floor(point[0] / self.cell_size), floor(point[1] / self.cell_size))
+
+    def add(self, point_id, point):
+        self.points[point_id] = point
+        self.cells.setdefault(self.cell(point), set()).add(point_id)
+
+    def remove(self, point_id):
+        cell = self.cell(self.points.pop(point_id))
+        ids = self.cells[cell]
+        ids.discard(point_id)
+        if not ids:
+            del self.cells[cell]
+
+    def nearest(self, location):
+        '''Return the id of the nearest point less than the radius from location, or None'''
+        x, y = location
+        ci, cj = self.cell(location)
+        best_id = None
+        best_dist = self.radius
+        for i in (ci - 1, ci, ci + 1):
+            for j in (cj - 1, cj, cj + 1):
+                for point_id in self.cells.get((i, j), ()):
+                    px, py = self.points[point_id]
+                    dist = hypot(px - x, py - y)
+                    if dist < best_dist or (dist == best_dist and best_id is not None and point_id < best_id):
+                        best_id = point_id
+                        best_dist = dist
+        return best_id
+
+
+def chain_paths(starts, ends, threshold):
+    '''
+    Group paths, given by lists of their (x, y) start and end points, into chains that can each
+    be drawn with pen-up moves shorter than threshold between its paths. Return a list of
+    chains, each a list of (path index, reversed) pairs in drawing order.
+
+    Chains are begun from each path not yet in a chain in turn, and grown from both ends by
+    the nearest free path end within threshold, reversing paths where it is their end.
+    Path ends are found in a PointHash, so this takes time roughly linear in the number of paths.
+    '''
+    free = PointHash(threshold)
+    # point 2k is the start of path k, and 2k + 1 its end
+    for k, (start, end) in enumerate(zip(starts, ends)):
+        free.add(2 * k, start)
+        free.add(2 * k + 1, end)
+
+    def take(k):
+        free.remove(2 * k)
+        free.remove(2 * k + 1)
+
+    chains = []
+    for k in range(len(starts)):
+        if 2 * k not in free.points:
+            continue
+        take(k)
+        chain = deque([(k, False)])
+        # extend forwards from the end of the chain ...
+        tail = ends[k]
+        while True:
+            point_id = free.nearest(tail)
+            if point_id is None:
+                break
+            m, reverse = divmod(point_id, 2)
+            take(m)
+            chain.append((m, bool(reverse)))
+            tail = starts[m] if reverse else ends[m]
+        # ... and backwards from its start
+        head = starts[k]
+        while True:
+            point_id = free.nearest(head)
+            if point_id is None:
+                break
+            m, at_start = divmod(point_id, 2)
+            # a path whose end is at the head is drawn forwards into it
+            at_start = not at_start
+            take(m)
+            chain.appendleft((m, at_start))
+            head = ends[m] if at_start else starts[m]
+        chains.append(list(chain))
+    return chains
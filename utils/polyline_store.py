@@ -0,0 +1,72 @@
+import pickle
+import tempfile
+from array import array
+
+
+class PolylineStore():
+    '''
+    An append-only, ordered store of flattened geometry.
+
+    Records are kept in memory until more than `max_points` points are held, at which point
+    the in-memory records are pickled to an anonymous temporary file. Iterating the store
+    yields every record in the order it was added: first the spilled ones, then the ones
+    still in memory. Records can also be read one at a time by their index, in any order; the
+    offset of each spilled record in the file is kept for that.
+    '''
+    def __init__(self, max_points=5_000_000):
+        self.max_points = max_points
+        self.records = []
+        self.points_in_memory = 0
+        self.spill_file = None
+        self.spilled_records = 0
+        self.offsets = array('q')
+
+    def append(self, record, num_points):
+        '''Add a record holding `num_points` points to the end of the store'''
+        self.records.append(record)
+        self.points_in_memory += num_points
+        if self.points_in_memory > self.max_points:
+            self.spill()
+
+    def spill(self):
+        '''Move the in-memory records onto disk'''
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.seek(0, 2)
+        for record in self.records:
+            self.offsets.append(self.spill_file.tell())
+            pickle.dump(record, self.spill_file, pickle.HIGHEST_PROTOCOL)
+        self.spilled_records += len(self.records)
+        self.records = []
+        self.points_in_memory = 0
+
+    def __len__(self):
+        return self.spilled_records + len(self.records)
+
+    def __getitem__(self, index):
+        '''Return the record at index, reading it back from disk if it has been spilled'''
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('PolylineStore index out of range')
+        if index >= self.spilled_records:
+            return self.records[index - self.spilled_records]
+        self.spill_file.seek(self.offsets[index])
+        return pickle.load(self.spill_file)
+
+    def __iter__(self):
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            for _ in range(self.spilled_records):
+                yield pickle.load(self.spill_file)
+        yield from self.records
+
+    def close(self):
+        '''Discard all records and remove the spill file'''
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        self.records = []
+        self.points_in_memory = 0
+        self.spilled_records = 0
+        self.offsets = array('q')
@@ -1,7 +1,11 @@
-from vectormath import Vector2
+import numpy as np
+
+from .vec2 import Vec2
 
 
 class Rect():
+    __slots__ = ('corner0', 'corner1')
+
     def __init__(self, corner0, corner1):
         self.corner0 = corner0
         self.corner1 = corner1
@@ -10,10 +14,17 @@ class Rect():
     def far_extents(cls):
         'Return a Rect with corners at +/- inf for min-max'
         return cls(
-            Vector2(float('inf'), float('inf')),
-            Vector2(float('-inf'), float('-inf'))
+            Vec2(float('inf'), float('inf')),
+            Vec2(float('-inf'), float('-inf'))
         )
 
+    @classmethod
+    def bounds(cls, points):
+        'Return the bounding Rect of an (n, 2) array of points, or far_extents() if it is empty'
+        if len(points) == 0:
+            return cls.far_extents()
+        return cls(Vec2.of(points.min(axis=0)), Vec2.of(points.max(axis=0)))
+
     def __str__(self):
         return f'{self.corner0} -> {self.corner1}'
 
@@ -22,8 +33,8 @@ class Rect():
 
     @property
     def size(self):
-        'Return a Vector2 from one corner to the other'
-        return Vector2(self.corner1.x - self.corner0.x, self.corner1.y - self.corner0.y)
+        'Return a Vec2 from one corner to the other'
+        return Vec2(self.corner1.x - self.corner0.x, self.corner1.y - self.corner0.y)
 
     def expand_to(self, vec_or_rect):
         '''
@@ -78,6 +89,23 @@ class Rect():
         '''Called from rect >= vec. Return true if the point is inside this rectangle, false otherwise'''
         return self.corner0.x <= vec.x <= self.corner1.x and self.corner0.y <= vec.y <= self.corner1.y
 
+    def contains(self, points, tolerance=0.0):
+        '''
+        Return an array of whether each of an (n, 2) array of points is inside this rectangle,
+        or no more than tolerance outside it
+        '''
+        x = points[:, 0]
+        y = points[:, 1]
+        return (
+            (x >= self.corner0.x - tolerance) & (x <= self.corner1.x + tolerance) &
+            (y >= self.corner0.y - tolerance) & (y <= self.corner1.y + tolerance)
+        )
+
+    def clip_points(self, points):
+        'Move any of an (n, 2) array of points that are outside this rectangle onto its edge, in place'
+        np.clip(points[:, 0], self.corner0.x, self.corner1.x, out=points[:, 0])
+        np.clip(points[:, 1], self.corner0.y, self.corner1.y, out=points[:, 1])
+
     @property
     def ratio(self):
         size = self.size
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def segment_distances(points, a, b):
+    '''Return the distance of each of points from the segment a -> b, all (n, 2) arrays'''
+    ab = b - a
+    ap = points - a
+    length2 = np.einsum('ij,ij->i', ab, ab)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.einsum('ij,ij->i', ap, ab) / length2
+    # a segment of no length is measured from its one point
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    offset = ap - t[:, None] * ab
+    return np.hypot(offset[:, 0], offset[:, 1])
+
+
+def simplify_polylines(polylines, tolerance):
+    '''
+    Return a list of (n, 2) arrays of points with the points of each that are within
+    tolerance of the line between the points kept either side of them left out, by the
+    Ramer-Douglas-Peucker algorithm. The ends of each polyline are always kept.
+
+    Rather than recursing into each half of a polyline in turn, every span still to be
+    simplified, across all of the polylines, is split at its furthest point in one numpy pass,
+    so there are only as many passes as the recursion is deep.
+    '''
+    if not polylines:
+        return []
+    points = np.concatenate(polylines)
+    sizes = np.array([len(polyline) for polyline in polylines])
+    ends = np.cumsum(sizes) - 1
+    starts = ends - sizes + 1
+    keep = np.zeros(len(points), dtype=bool)
+    keep[starts] = True
+    keep[ends] = True
+
+    # the spans of points between two kept points that may still be left out
+    spans = sizes > 2
+    starts = starts[spans]
+    ends = ends[spans]
+    while len(starts):
+        inner = ends - starts - 1
+        span = np.repeat(np.arange(len(starts)), inner)
+        offsets = np.cumsum(inner) - inner
+        index = np.arange(len(span)) - offsets[span] + starts[span] + 1
+        distances = segment_distances(points[index], points[starts[span]], points[ends[span]])
+
+        # the first furthest point of each span
+        furthest = np.maximum.reduceat(distances, offsets)
+        is_furthest = np.flatnonzero(distances == furthest[span])
+        # spans are in order, so their first furthest points are where the span changes
+        first = np.flatnonzero(np.diff(span[is_furthest], prepend=-1))
+        split = furthest > tolerance
+        middles = index[is_furthest[first]][split]
+        keep[middles] = True
+
+        starts, ends = np.concatenate((starts[split], middles)), np.concatenate((middles, ends[split]))
+        spans = ends - starts > 1
+        starts = starts[spans]
+        ends = ends[spans]
+
+    kept = np.add.reduceat(keep, np.cumsum(sizes) - sizes)
+    return np.split(points[keep], np.cumsum(kept)[:-1])
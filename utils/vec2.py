@@ -0,0 +1,72 @@
+class Vec2():
+    '''
+    A 2D vector of two floats, for the handful of coordinates used to lay out a plot.
+    Arithmetic works elementwise with another Vec2 or with a number.
+    '''
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = float(x)
+        self.y = float(y)
+
+    @classmethod
+    def of(cls, pair):
+        'Return a Vec2 from any x, y pair, such as a tuple or a numpy array'
+        x, y = pair
+        return cls(x, y)
+
+    def __str__(self):
+        return f'[{self.x}, {self.y}]'
+
+    def __repr__(self):
+        return f'Vec2({self.x}, {self.y})'
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, i):
+        return (self.x, self.y)[i]
+
+    def __eq__(self, other):
+        return isinstance(other, Vec2) and self.x == other.x and self.y == other.y
+
+    def __neg__(self):
+        return Vec2(-self.x, -self.y)
+
+    def __add__(self, other):
+        if isinstance(other, Vec2):
+            return Vec2(self.x + other.x, self.y + other.y)
+        return Vec2(self.x + other, self.y + other)
+
+    def __sub__(self, other):
+        if isinstance(other, Vec2):
+            return Vec2(self.x - other.x, self.y - other.y)
+        return Vec2(self.x - other, self.y - other)
+
+    def __mul__(self, other):
+        if isinstance(other, Vec2):
+            return Vec2(self.x * other.x, self.y * other.y)
+        return Vec2(self.x * other, self.y * other)
+
+    def __truediv__(self, other):
+        if isinstance(other, Vec2):
+            return Vec2(self.x / other.x, self.y / other.y)
+        return Vec2(self.x / other, self.y / other)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def clip(self, min=None, max=None):
+        'Return this vector with each coordinate limited to those of the vectors min and max'
+        x, y = self.x, self.y
+        if min is not None:
+            x = x if x > min.x else min.x
+            y = y if y > min.y else min.y
+        if max is not None:
+            x = x if x < max.x else max.x
+            y = y if y < max.y else max.y
+        return Vec2(x, y)